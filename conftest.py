@@ -5,3 +5,12 @@ from django.utils.translation import activate
 @pytest.fixture(autouse=True)
 def set_default_language():
     activate('en')
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # cached responses/versions must not leak between tests (the database is rolled back)
+    from django.core.cache import cache
+    from kitamanager.cache import parse_upload_clear
+    cache.clear()
+    parse_upload_clear()
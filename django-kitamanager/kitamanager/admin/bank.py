@@ -6,7 +6,7 @@ from django.urls import path, reverse
 from django.shortcuts import redirect
 from django import forms
 from django.core.exceptions import ValidationError
-from kitamanager.bankimport import BankAccountEntryImport
+from kitamanager.cache import parse_upload
 from dateutil.relativedelta import relativedelta
 from kitamanager.models import (
     BankAccount,
@@ -20,7 +20,7 @@ class BankAccountAdmin(admin.ModelAdmin):
 
 def validate_bankaccountentry_import(value):
     try:
-        BankAccountEntryImport(value)
+        parse_upload(value, "kitamanager.bankimport.BankAccountEntryImport")
     except Exception:
         raise ValidationError(_(f"Can not import file {value}. Wrong format?"))
 
@@ -51,7 +51,8 @@ class BankAccountEntryAdmin(admin.ModelAdmin):
             form = BankAccountEntryImportForm(request.POST, request.FILES)
             if form.is_valid():
                 f = form.cleaned_data["file_xls"]
-                baei = BankAccountEntryImport(f)
+                # already parsed by the form validator
+                baei = parse_upload(f, "kitamanager.bankimport.BankAccountEntryImport")
                 for account_name, balance in baei.balance.items():
                     ba, created = BankAccount.objects.get_or_create(name=account_name)
                     # we assume here, that the date will be 1 month back
@@ -7,7 +7,7 @@ from django.contrib import messages
 from django.urls import path, reverse
 from django.shortcuts import redirect
 from django.utils.safestring import mark_safe
-from kitamanager.berlin import BerlinInvoice
+from kitamanager.cache import parse_upload
 from kitamanager.definitions import REVENUE_NAME_BERLIN
 from kitamanager.models import RevenueName, RevenueEntry, ChildContract, Child
 from dateutil.relativedelta import relativedelta
@@ -15,7 +15,7 @@ from dateutil.relativedelta import relativedelta
 
 def validate_berlin_invoice(value):
     try:
-        BerlinInvoice(value)
+        parse_upload(value, "kitamanager.berlin.BerlinInvoice")
     except Exception:
         raise ValidationError(
             _(f"Can not import file {value}. Is this a valid decrypted .xslx file from the Berliner Senat?")
@@ -54,7 +54,8 @@ class RevenueEntryAdmin(admin.ModelAdmin):
             form = BerlinInvoiceImportForm(request.POST, request.FILES)
             if form.is_valid():
                 f = form.cleaned_data["file_xls"]
-                invoice = BerlinInvoice(f)
+                # already parsed by the form validator
+                invoice = parse_upload(f, "kitamanager.berlin.BerlinInvoice")
                 # get or create RevenueName
                 revenue_name, created = RevenueName.objects.get_or_create(name=REVENUE_NAME_BERLIN)
 
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class KitamanagerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "kitamanager"
+
+    def ready(self):
+        # connect the signal receivers
+        from kitamanager import signals  # noqa: F401
@@ -1,7 +1,8 @@
 from openpyxl import load_workbook
 from efc.interfaces.iopenpyxl import OpenpyxlInterface
 import datetime
-from typing import Optional, Dict
+from functools import cached_property
+from typing import Optional, Dict, Tuple
 from decimal import Decimal
 
 """
@@ -11,16 +12,35 @@ See https://www.berlin.de/sen/jugend/traegerservice/isbj/dokumentation_abrechnun
 
 
 class BerlinInvoice:
-    def __init__(self, filename):
+    def __init__(self, filename, read_only: bool = True):
+        """
+        :param filename: the .xlsx file (a path or a file-like object)
+        :param read_only: stream the workbook (values only, much less memory). The full (editable)
+            workbook is only needed when writing to it. Call close() (or use a with statement) when done
+        """
         self._filename = filename
-        self._wb = load_workbook(filename=filename)
-        self._interface = OpenpyxlInterface(wb=self._wb, use_cache=True)
+        self._wb = load_workbook(filename=filename, read_only=read_only)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """close the workbook (a read-only workbook keeps the file open)"""
+        self._wb.close()
 
     @property
     def wb(self):
         """the workbook"""
         return self._wb
 
+    @cached_property
+    def _interface(self) -> OpenpyxlInterface:
+        """the formula evaluator. Only used for the cells which are formulas"""
+        return OpenpyxlInterface(wb=self._wb, use_cache=True)
+
     @property
     def date(self) -> datetime.date:
         ws = self.wb["Abrechnungsübersicht"]
@@ -37,80 +57,90 @@ class BerlinInvoice:
         Pay amount in Euro
         """
         ws = self.wb["Abrechnungsübersicht"]
-        for cell in ws["A"]:
-            if cell.value == "Summe:":
+        for row, (value,) in enumerate(ws.iter_rows(min_col=1, max_col=1, values_only=True), start=1):
+            if value == "Summe:":
                 # older (than 2025-07) senatsabrechnungen have the summe in the column D, newer in I
-                value = self._interface.calc_cell(f"D{cell.row}", "Abrechnungsübersicht")
+                value = self._interface.calc_cell(f"D{row}", "Abrechnungsübersicht")
                 if not value:
-                    value = self._interface.calc_cell(f"I{cell.row}", "Abrechnungsübersicht")
+                    value = self._interface.calc_cell(f"I{row}", "Abrechnungsübersicht")
                 return Decimal(value).quantize(Decimal("0.00"))
         raise Exception("Unable to find Summe from Abrechnungsuebersicht")
 
-    @property
+    @cached_property
     def children(self) -> Dict[str, Dict[str, str]]:
         """
         List of children from the invoice
+        The rows are streamed (values only) and parsed once
         """
         children: Dict[str, Dict[str, str]] = dict()
         ws = self.wb["Vertragsübersicht"]
         # die kinderliste faengt bei Reihe 8 an
-        for row in ws.iter_rows(min_row=9):
+        for row in ws.iter_rows(min_row=9, max_col=14, values_only=True):
             # ende when kein gutscheincode da ist
-            if not row[4] or not row[4].value:
+            if not row[4]:
                 break
             data = dict()
-            name = row[5].value.split(",")
+            name = row[5].split(",")
             data["last_name"] = name[0].strip()
             data["first_name"] = name[1].strip()
             pay_tags = []
             # betreuungsumfang
-            if row[13].value == "erweitert":
+            if row[13] == "erweitert":
                 pay_tags.append("ganztag erweitert")
-            elif row[13].value == "ganztags":
+            elif row[13] == "ganztags":
                 pay_tags.append("ganztag")
-            elif row[13].value == "teilzeit":
+            elif row[13] == "teilzeit":
                 pay_tags.append("teilzeit")
-            elif row[13].value == "halbtag":
+            elif row[13] == "halbtag":
                 pay_tags.append("halbtag")
             else:
-                raise Exception(f'Unknown Betreuungsumfang "{row[13].value}" in Senatsabrechnung')
+                raise Exception(f'Unknown Betreuungsumfang "{row[13]}" in Senatsabrechnung')
 
             # QM (Quartiersmanagment)
-            if row[8].value == "nein":
+            if row[8] == "nein":
                 pass
-            elif row[8].value == "ja":
+            elif row[8] == "ja":
                 pay_tags.append("qm/mss")
             else:
-                raise Exception(f'Unknown QM "{row[8].value}" in Senatsabrechnung')
+                raise Exception(f'Unknown QM "{row[8]}" in Senatsabrechnung')
 
             # MSS (Monitoring Soziale Stadtentwicklung)
-            if row[9].value == "nein":
+            if row[9] == "nein":
                 pass
-            elif row[9].value == "ja":
+            elif row[9] == "ja":
                 pay_tags.append("qm/mss")
             else:
-                raise Exception(f'Unknown MSS "{row[9].value}" in Senatsabrechnung')
+                raise Exception(f'Unknown MSS "{row[9]}" in Senatsabrechnung')
 
             # Hs (Herkunftssprache)
-            if row[10].value == "D":
+            if row[10] == "D":
                 pass
-            elif row[10].value == "ND":
+            elif row[10] == "ND":
                 pay_tags.append("ndh")
             else:
-                raise Exception(f'Unknown Hs "{row[10].value}" in Senatsabrechnung')
+                raise Exception(f'Unknown Hs "{row[10]}" in Senatsabrechnung')
 
             #  SpH (Sozialpäd. Hilfe)
-            if row[11].value == "N":
+            if row[11] == "N":
                 pass
-            elif row[11].value == "A":
+            elif row[11] == "A":
                 pay_tags.append("integration a")
-            elif row[11].value == "B":
+            elif row[11] == "B":
                 pay_tags.append("integration b")
             else:
-                raise Exception(f'Unknown SpH "{row[11].value}" in Senatsabrechnung')
+                raise Exception(f'Unknown SpH "{row[11]}" in Senatsabrechnung')
 
             data["pay_tags"] = sorted(list(set(pay_tags)))
             # voucher number as key
-            children[row[4].value] = data
+            children[row[4]] = data
 
         return children
+
+
+def read_invoice_pay(filename) -> Tuple[datetime.date, Optional[Decimal]]:
+    """
+    The date and the pay amount of a single invoice file
+    A module level function so it can be used within a process pool
+    """
+    with BerlinInvoice(filename) as invoice:
+        return invoice.date, invoice.pay
@@ -0,0 +1,128 @@
+import datetime
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Tuple, TypeVar, Union
+from urllib.parse import quote
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils.module_loading import import_string
+from django.http import HttpResponse
+from django.utils.translation import get_language
+
+
+def _version_key(name: str) -> str:
+    return f"kitamanager:version:{name}"
+
+
+def version_get(name: str) -> int:
+    """
+    Get the current version for the given name
+    The version is stored in the configured django cache so when that cache is shared
+    (eg. file based or memcached), multiple worker processes see the same version
+    """
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        # a unique start value so a evicted and re-created key never reuses an old version
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def version_bump(name: str) -> None:
+    """
+    Increase the version for the given name so everything cached for the old version is invalid
+    """
+    key = _version_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def version_bump_on_commit(name: str) -> None:
+    """
+    Increase the version for the given name once the current transaction is committed
+    (immediately when not in a transaction). Bumping before the commit would let a concurrent
+    request read the old data and cache it for the new version
+    """
+    transaction.on_commit(functools.partial(version_bump, name))
+
+
+# version for all data stored in the database (bumped on every model change, see kitamanager.signals)
+DATA_VERSION = "data"
+
+
+def cached_response(view):
+    """
+    Decorator to cache the response of a (JSON) view
+    The key contains the view, the historydate (today if not given), the language and
+    the current DATA_VERSION so a cached response is never served after data changed
+    """
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        historydate = request.GET.get("historydate", datetime.date.today().isoformat())
+        key = (
+            f"kitamanager:response:{view.__module__}.{view.__name__}:{version_get(DATA_VERSION)}:"
+            f"{get_language()}:{quote(historydate)}"
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, (response.content, response["Content-Type"]))
+        return response
+
+    return wrapper
+
+
+T = TypeVar("T")
+
+# number of parsed uploads kept in memory (per process)
+PARSED_UPLOADS_MAX = 8
+_parsed_uploads: "OrderedDict[Tuple[str, str, str], Any]" = OrderedDict()
+_parsed_uploads_lock = threading.Lock()
+
+
+def parse_upload(upload, parser: Union[str, Callable[[ContentFile], T]]) -> T:
+    """
+    Parse an uploaded file only once
+    The parsed document is kept in memory (per process) keyed by the parser, the file name and
+    the sha256 of the content, so the form validator and the view share a single parse and
+    uploading an identical file again skips the parsing. The parser gets an in memory copy of the
+    upload (with the same name) because the upload itself is closed at the end of the request
+    :param upload: the uploaded file
+    :param parser: called with the file to parse it (eg. BerlinInvoice). Can be a dotted path
+        (eg. "kitamanager.berlin.BerlinInvoice") so the parser and its (heavy) dependencies are
+        only imported when a file is actually uploaded
+    """
+    parse_fn: Callable[[ContentFile], T] = import_string(parser) if isinstance(parser, str) else parser
+    content = b"".join(upload.chunks())
+    key = (f"{parse_fn.__module__}.{parse_fn.__qualname__}", upload.name, hashlib.sha256(content).hexdigest())
+    with _parsed_uploads_lock:
+        if key in _parsed_uploads:
+            _parsed_uploads.move_to_end(key)
+            return _parsed_uploads[key]
+
+    # parse errors are raised (and not cached)
+    parsed = parse_fn(ContentFile(content, name=upload.name))
+    with _parsed_uploads_lock:
+        _parsed_uploads[key] = parsed
+        while len(_parsed_uploads) > PARSED_UPLOADS_MAX:
+            _parsed_uploads.popitem(last=False)
+    return parsed
+
+
+def parse_upload_clear() -> None:
+    """
+    Forget all parsed uploads
+    """
+    with _parsed_uploads_lock:
+        _parsed_uploads.clear()
@@ -0,0 +1,37 @@
+import csv
+from django.http import StreamingHttpResponse
+from typing import Any, Iterable
+
+# number of rows fetched at once from the database (server side cursor)
+CSV_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """
+    A file-like object which returns the written value instead of storing it
+    see https://docs.djangoproject.com/en/5.0/howto/outputting-csv/#streaming-large-csv-files
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def csv_response(filename: str, header: Iterable[Any], rows: Iterable[Iterable[Any]]) -> StreamingHttpResponse:
+    """
+    A streaming CSV response so the rows are never kept in memory at once
+    :param filename: the filename for the Content-Disposition header
+    :param header: the header row
+    :param rows: the rows (eg. a queryset values_list() iterator)
+    """
+    writer = csv.writer(Echo())
+
+    def _lines():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    return StreamingHttpResponse(
+        _lines(),
+        content_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -2,7 +2,7 @@ import datetime
 from django import forms
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
-from kitamanager.sage_payroll import SagePayrolls
+from kitamanager.cache import parse_upload
 
 
 class HistoryDateForm(forms.Form):
@@ -15,6 +15,22 @@ class HistoryDateForm(forms.Form):
     )
 
 
+class DateRangeForm(forms.Form):
+    """
+    A form to select a range of months (start included, end excluded)
+    """
+
+    start = forms.DateField(widget=forms.DateInput(attrs={"type": "date"}))
+    end = forms.DateField(widget=forms.DateInput(attrs={"type": "date"}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get("start"), cleaned_data.get("end")
+        if start and end and start >= end:
+            raise ValidationError(_("The start date must be before the end date"))
+        return cleaned_data
+
+
 class EmployeeBonusPaymentForm(forms.Form):
     """
     A form to calculate a possible Employee Bonus payment
@@ -26,7 +42,7 @@ class EmployeeBonusPaymentForm(forms.Form):
 
 def _validate_sage_payroll(value):
     try:
-        SagePayrolls(value)
+        parse_upload(value, "kitamanager.sage_payroll.SagePayrolls")
     except Exception:
         raise ValidationError(_(f"Can not read file {value}. This should be a PDF file. Wrong format?"))
 
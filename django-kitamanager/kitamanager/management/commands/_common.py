@@ -0,0 +1,45 @@
+import datetime
+from django.db import models
+from typing import Any, Dict, Hashable, List, Tuple
+
+import yaml
+
+# the C implementation is much faster but not available everywhere (libyaml is optional)
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def yaml_load(stream) -> Any:
+    """
+    Load an imported yaml file with the fastest available (safe) loader
+    """
+    return yaml.load(stream, Loader=YAML_LOADER)
+
+
+def yaml_date(value) -> datetime.date:
+    """
+    A date from an imported yaml file (either already parsed by yaml or as ISO string)
+    """
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value)
+
+
+def diff_objects(
+    existing: Dict[Hashable, models.Model], wanted: Dict[Hashable, Dict[str, Any]]
+) -> Tuple[List[Hashable], List[models.Model], List[models.Model]]:
+    """
+    Compare existing model instances with the wanted field values (both keyed by the same natural key)
+    The wanted values are set on the changed instances, so they can be passed to bulk_update()
+    :return: a tuple with the keys to create, the changed instances and the instances which are not wanted anymore
+    """
+    create, changed = [], []
+    for key, values in wanted.items():
+        obj = existing.get(key)
+        if obj is None:
+            create.append(key)
+        elif any(getattr(obj, k) != v for k, v in values.items()):
+            for k, v in values.items():
+                setattr(obj, k, v)
+            changed.append(obj)
+    deleted = [obj for key, obj in existing.items() if key not in wanted]
+    return create, changed, deleted
@@ -1,8 +1,33 @@
 import argparse
 from django.core.management.base import BaseCommand
-from kitamanager.models import Child, ChildContract, ChildPaymentPlan, Area
+from django.db import transaction
+from kitamanager.cache import DATA_VERSION, version_bump_on_commit
+from kitamanager.models import Child, ChildContract, ChildPaymentPlan, Area, MonthlyFact
+from kitamanager.management.commands._common import yaml_date, yaml_load
 
-import yaml
+
+def _pay_tags(contract) -> list:
+    """
+    The pay tags for a contract from the old kitamanager export
+    """
+    pay_tag_list = []
+    if contract["integration_a"]:
+        pay_tag_list.append("integration a")
+    if contract["integration_b"]:
+        pay_tag_list.append("integration b")
+    if contract["qm"]:
+        pay_tag_list.append("qm/mss")
+    if contract["ndh"]:
+        pay_tag_list.append("ndh")
+    if contract["care_period"] == "gte":
+        pay_tag_list.append("ganztag erweitert")
+    if contract["care_period"] == "gt":
+        pay_tag_list.append("ganztag")
+    if contract["care_period"] == "tz":
+        pay_tag_list.append("teilzeit")
+    if contract["care_period"] == "ht":
+        pay_tag_list.append("halbtag")
+    return pay_tag_list
 
 
 class Command(BaseCommand):
@@ -11,54 +36,86 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("paymentplan-name", type=str)
         parser.add_argument("child-file", type=argparse.FileType("r"))
+        parser.add_argument("--batch-size", type=int, default=1000, help="number of rows per bulk query")
+        parser.add_argument("--dry-run", action="store_true", help="import everything but rollback at the end")
 
     def handle(self, *args, **options):
-        paymentplan_name = options["paymentplan-name"]
+        batch_size = options["batch_size"]
+        plan = ChildPaymentPlan.objects.get(name=options["paymentplan-name"])
+        data = yaml_load(options["child-file"])
 
-        plan = ChildPaymentPlan.objects.get(name=paymentplan_name)
+        with transaction.atomic():
+            # areas
+            areas = {a.name: a for a in Area.objects.all()}
+            new_areas = {
+                c["area"]: Area(name=c["area"], educational=c["area"] != "Sonstiges")
+                for child in data["kinder"]
+                for c in child["contracts"]
+                if c["area"] not in areas
+            }
+            Area.objects.bulk_create(new_areas.values(), batch_size=batch_size)
+            areas.update(new_areas)
 
-        data = yaml.safe_load(options["child-file"])
+            # children (keyed by the unique first name, last name and birth date)
+            children = {(c.first_name, c.last_name, c.birth_date): c for c in Child.objects.all()}
+            children_existing = [c.pk for c in children.values()]
+            children_new, children_changed = dict(), []
+            for child in data["kinder"]:
+                key = (child["first_name"], child["last_name"], yaml_date(child["birth_date"]))
+                if key in children:
+                    if children[key].voucher != child["voucher"]:
+                        children[key].voucher = child["voucher"]
+                        children_changed.append(children[key])
+                elif key not in children_new:
+                    children_new[key] = Child(
+                        first_name=child["first_name"],
+                        last_name=child["last_name"],
+                        birth_date=key[2],
+                        voucher=child["voucher"],
+                    )
+            Child.objects.bulk_create(children_new.values(), batch_size=batch_size)
+            Child.objects.bulk_update(children_changed, ["voucher"], batch_size=batch_size)
+            children.update(children_new)
 
-        for child in data["kinder"]:
-            p, created = Child.objects.get_or_create(
-                first_name=child["first_name"],
-                last_name=child["last_name"],
-                birth_date=child["birth_date"],
-                voucher=child["voucher"],
+            # contracts (keyed by the child, start and end)
+            contracts = {
+                (c.person_id, c.start, c.end): c for c in ChildContract.objects.filter(person__in=children_existing)
+            }
+            contracts_new, contracts_changed = dict(), []
+            for child in data["kinder"]:
+                person = children[(child["first_name"], child["last_name"], yaml_date(child["birth_date"]))]
+                for c in child["contracts"]:
+                    key = (person.pk, yaml_date(c["begin"]), yaml_date(c["end"]))
+                    values = dict(area=areas[c["area"]], pay_plan=plan, pay_tags=_pay_tags(c))
+                    if key in contracts:
+                        contract = contracts[key]
+                        if any(getattr(contract, k) != v for k, v in values.items()):
+                            for k, v in values.items():
+                                setattr(contract, k, v)
+                            contracts_changed.append(contract)
+                    elif key not in contracts_new:
+                        contracts_new[key] = ChildContract(person=person, start=key[1], end=key[2], **values)
+            ChildContract.objects.bulk_create(contracts_new.values(), batch_size=batch_size)
+            ChildContract.objects.bulk_update(
+                contracts_changed, ["area", "pay_plan", "pay_tags"], batch_size=batch_size
             )
-            print(p, created)
-            for c in child["contracts"]:
-                if c["area"] == "Sonstiges":
-                    area, created = Area.objects.get_or_create(name=c["area"], defaults=dict(educational=False))
-                else:
-                    area, created = Area.objects.get_or_create(name=c["area"], defaults=dict(educational=True))
 
-                pay_tag_list = []
-                if c["integration_a"]:
-                    pay_tag_list.append("integration a")
-                if c["integration_b"]:
-                    pay_tag_list.append("integration b")
-                if c["qm"]:
-                    pay_tag_list.append("qm/mss")
-                if c["ndh"]:
-                    pay_tag_list.append("ndh")
-                if c["care_period"] == "gte":
-                    pay_tag_list.append("ganztag erweitert")
-                if c["care_period"] == "gt":
-                    pay_tag_list.append("ganztag")
-                if c["care_period"] == "tz":
-                    pay_tag_list.append("teilzeit")
-                if c["care_period"] == "ht":
-                    pay_tag_list.append("halbtag")
+            # bulk queries do not send any signals
+            changed = list(contracts_new.values()) + contracts_changed
+            if changed:
+                MonthlyFact.objects.invalidate(min(c.start for c in changed), max(c.end for c in changed))
+
+            if new_areas or children_new or children_changed or changed:
+                version_bump_on_commit(DATA_VERSION)
 
-                ec, created = ChildContract.objects.get_or_create(
-                    person=p,
-                    start=c["begin"],
-                    end=c["end"],
-                    area=area,
-                    pay_plan=plan,
-                    pay_tags=pay_tag_list,
-                )
-                print(ec, created)
+            if options["dry_run"]:
+                transaction.set_rollback(True)
 
-        self.stdout.write(self.style.SUCCESS("Done"))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'Dry run' if options['dry_run'] else 'Done'}: "
+                f"areas: {len(new_areas)} created, "
+                f"children: {len(children_new)} created, {len(children_changed)} updated, "
+                f"contracts: {len(contracts_new)} created, {len(contracts_changed)} updated"
+            )
+        )
@@ -1,8 +1,11 @@
 import argparse
+from decimal import Decimal
 from django.core.management.base import BaseCommand
-from kitamanager.models import ChildPaymentPlan, ChildPaymentTable, ChildPaymentTableEntry
-
-import yaml
+from django.db import transaction
+from kitamanager.cache import DATA_VERSION, version_bump_on_commit
+from kitamanager.models import ChildPaymentPlan, ChildPaymentTable, ChildPaymentTableEntry, MonthlyFact
+from kitamanager.models.child_payment import CHILD_PAYMENT_RATES_VERSION
+from kitamanager.management.commands._common import diff_objects, yaml_date, yaml_load
 
 
 class Command(BaseCommand):
@@ -11,36 +14,83 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("paymentplan-name", type=str)
         parser.add_argument("payment-file", type=argparse.FileType("r"))
+        parser.add_argument("--dry-run", action="store_true", help="import everything but rollback at the end")
 
     def handle(self, *args, **options):
-        paymentplan_name = options["paymentplan-name"]
-        data = yaml.safe_load(options["payment-file"])
-
-        plan, created = ChildPaymentPlan.objects.get_or_create(name=paymentplan_name)
-        self.stdout.write(self.style.SUCCESS(f"Using plan {plan} (newly created? {created})"))
-
-        for el in data:
-            defaults_table = dict()
-            if el.get("comment"):
-                defaults_table["comment"] = el["comment"]
-            table, created = ChildPaymentTable.objects.update_or_create(
-                plan=plan, start=el["from"], end=el["to"], defaults=defaults_table
-            )
-            self.stdout.write(self.style.SUCCESS(f"{plan}: Using table >{table}< (newly created? {created})"))
-
-            for entry in el["entries"]:
-                for key, value in entry["properties"].items():
-                    defaults_entry = dict(pay=value["payment"], requirement=value["requirement"])
-                    if value.get("comment"):
-                        defaults_entry["comment"] = value["comment"]
-                    table_entry, created = ChildPaymentTableEntry.objects.update_or_create(
-                        table=table,
-                        age_start=entry["age"][0],
-                        age_end=entry["age"][1],
-                        name=key,
-                        defaults=defaults_entry,
+        data = yaml_load(options["payment-file"])
+
+        with transaction.atomic():
+            # signals (eg. from deleted entries) only invalidate the monthly facts once
+            with MonthlyFact.objects.deferred_invalidation():
+                plan, created = ChildPaymentPlan.objects.get_or_create(name=options["paymentplan-name"])
+
+                # tables (keyed by start and end). Tables which are not in the file are kept
+                tables = {(t.start, t.end): t for t in plan.tables.all()}
+                tables_wanted = dict()
+                for el in data:
+                    tables_wanted[(yaml_date(el["from"]), yaml_date(el["to"]))] = (
+                        dict(comment=el["comment"]) if el.get("comment") else dict()
                     )
-                    self.stdout.write(
-                        self.style.SUCCESS(f"{plan}: table {table}: {key}:{value} (newly created? {created})")
+                tables_create, tables_changed, _ = diff_objects(tables, tables_wanted)
+                tables_new = [
+                    ChildPaymentTable(plan=plan, start=k[0], end=k[1], **tables_wanted[k]) for k in tables_create
+                ]
+                ChildPaymentTable.objects.bulk_create(tables_new)
+                ChildPaymentTable.objects.bulk_update(tables_changed, ["comment"])
+                tables.update({(t.start, t.end): t for t in tables_new})
+
+                # entries (keyed by table, age range and name) of all tables in the file
+                table_pks = [tables[k].pk for k in tables_wanted]
+                entries = {
+                    (e.table_id, e.age_start, e.age_end, e.name): e
+                    for e in ChildPaymentTableEntry.objects.filter(table__in=table_pks)
+                }
+                entries_wanted = dict()
+                for el in data:
+                    table = tables[(yaml_date(el["from"]), yaml_date(el["to"]))]
+                    for entry in el["entries"]:
+                        for key, value in entry["properties"].items():
+                            values = dict(
+                                pay=Decimal(str(value["payment"])), requirement=Decimal(str(value["requirement"]))
+                            )
+                            if value.get("comment"):
+                                values["comment"] = value["comment"]
+                            entries_wanted[(table.pk, entry["age"][0], entry["age"][1], key)] = values
+                entries_create, entries_changed, entries_deleted = diff_objects(entries, entries_wanted)
+                ChildPaymentTableEntry.objects.bulk_create(
+                    [
+                        ChildPaymentTableEntry(
+                            table_id=k[0], age_start=k[1], age_end=k[2], name=k[3], **entries_wanted[k]
+                        )
+                        for k in entries_create
+                    ]
+                )
+                ChildPaymentTableEntry.objects.bulk_update(entries_changed, ["pay", "requirement", "comment"])
+                ChildPaymentTableEntry.objects.filter(pk__in=[e.pk for e in entries_deleted]).delete()
+
+                # bulk queries do not send any signals
+                tables_by_pk = {t.pk: t for t in tables.values()}
+                changed_tables = {t.pk: t for t in tables_new + tables_changed}
+                for table_pk in [k[0] for k in entries_create] + [e.table_id for e in entries_changed]:
+                    changed_tables[table_pk] = tables_by_pk[table_pk]
+                if changed_tables:
+                    MonthlyFact.objects.invalidate(
+                        min(t.start for t in changed_tables.values()), max(t.end for t in changed_tables.values())
                     )
-        self.stdout.write(self.style.SUCCESS("Done"))
+
+            if created or changed_tables or entries_deleted:
+                version_bump_on_commit(CHILD_PAYMENT_RATES_VERSION)
+                version_bump_on_commit(DATA_VERSION)
+
+            if options["dry_run"]:
+                transaction.set_rollback(True)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'Dry run' if options['dry_run'] else 'Done'}: plan {plan} (newly created? {created}), "
+                f"tables: {len(tables_new)} created, {len(tables_changed)} updated, "
+                f"entries: {len(entries_create)} created, {len(entries_changed)} updated, "
+                f"{len(entries_deleted)} deleted, "
+                f"{len(entries_wanted) - len(entries_create) - len(entries_changed)} unchanged"
+            )
+        )
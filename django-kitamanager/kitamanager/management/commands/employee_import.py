@@ -1,8 +1,24 @@
 import argparse
+import time
+from decimal import Decimal
 from django.core.management.base import BaseCommand
-from kitamanager.models import Employee, EmployeeContract, EmployeePaymentPlan, Area, EmployeeQualification
+from django.db import transaction
+from kitamanager.cache import DATA_VERSION, version_bump_on_commit
+from kitamanager.models import Employee, EmployeeContract, EmployeePaymentPlan, Area, EmployeeQualification, MonthlyFact
+from kitamanager.management.commands._common import yaml_date, yaml_load
 
-import yaml
+# the EmployeeContract fields which are updated when a contract (same employee, start and end) already exists
+CONTRACT_FIELDS = [
+    "area",
+    "qualification",
+    "hours_child",
+    "hours_management",
+    "hours_team",
+    "hours_misc",
+    "pay_plan",
+    "pay_group",
+    "pay_level",
+]
 
 
 class Command(BaseCommand):
@@ -11,41 +27,97 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("paymentplan-name", type=str)
         parser.add_argument("employee-file", type=argparse.FileType("r"))
+        parser.add_argument("--batch-size", type=int, default=1000, help="number of rows per bulk query")
+        parser.add_argument("--dry-run", action="store_true", help="import everything but rollback at the end")
 
     def handle(self, *args, **options):
-        paymentplan_name = options["paymentplan-name"]
+        time_start = time.perf_counter()
+        batch_size = options["batch_size"]
+        plan = EmployeePaymentPlan.objects.get(name=options["paymentplan-name"])
+        data = yaml_load(options["employee-file"])
+        contracts_data = [c for employee in data["mitarbeiter"] for c in employee["contracts"]]
 
-        plan = EmployeePaymentPlan.objects.get(name=paymentplan_name)
+        with transaction.atomic():
+            # areas and qualifications
+            areas = {a.name: a for a in Area.objects.all()}
+            new_areas = {
+                c["area"]: Area(name=c["area"], educational=c["area"] != "Sonstiges")
+                for c in contracts_data
+                if c["area"] not in areas
+            }
+            Area.objects.bulk_create(new_areas.values(), batch_size=batch_size)
+            areas.update(new_areas)
+            qualifications = {q.name: q for q in EmployeeQualification.objects.all()}
+            new_qualifications = {
+                c["qualification"]: EmployeeQualification(name=c["qualification"])
+                for c in contracts_data
+                if c["qualification"] not in qualifications
+            }
+            EmployeeQualification.objects.bulk_create(new_qualifications.values(), batch_size=batch_size)
+            qualifications.update(new_qualifications)
 
-        data = yaml.safe_load(options["employee-file"])
+            # employees (keyed by the unique first name, last name and birth date)
+            employees = {(e.first_name, e.last_name, e.birth_date): e for e in Employee.objects.all()}
+            employees_existing = [e.pk for e in employees.values()]
+            employees_new = dict()
+            for employee in data["mitarbeiter"]:
+                key = (employee["first_name"], employee["last_name"], yaml_date(employee["birth_date"]))
+                if key not in employees and key not in employees_new:
+                    employees_new[key] = Employee(first_name=key[0], last_name=key[1], birth_date=key[2])
+            Employee.objects.bulk_create(employees_new.values(), batch_size=batch_size)
+            employees.update(employees_new)
 
-        for employee in data["mitarbeiter"]:
-            e, created = Employee.objects.get_or_create(
-                first_name=employee["first_name"],
-                last_name=employee["last_name"],
-                birth_date=employee["birth_date"],
+            # contracts (keyed by the employee, start and end). Unchanged contracts are not written at all
+            contracts = {
+                (c.person_id, c.start, c.end): c for c in EmployeeContract.objects.filter(person__in=employees_existing)
+            }
+            contracts_new, contracts_changed = dict(), []
+            for employee in data["mitarbeiter"]:
+                person = employees[(employee["first_name"], employee["last_name"], yaml_date(employee["birth_date"]))]
+                for c in employee["contracts"]:
+                    key = (person.pk, yaml_date(c["begin"]), yaml_date(c["end"]))
+                    values = dict(
+                        area=areas[c["area"]],
+                        qualification=qualifications[c["qualification"]],
+                        hours_child=Decimal(str(c["hours_child"])),
+                        hours_management=Decimal(str(c["hours_management"])),
+                        hours_team=Decimal(str(c["hours_team"])),
+                        hours_misc=Decimal(str(c["hours_misc"])),
+                        pay_plan=plan,
+                        pay_group=c["pay_group"],
+                        pay_level=c["pay_level"],
+                    )
+                    if key in contracts:
+                        contract = contracts[key]
+                        if any(getattr(contract, k) != v for k, v in values.items()):
+                            for k, v in values.items():
+                                setattr(contract, k, v)
+                            contracts_changed.append(contract)
+                    elif key not in contracts_new:
+                        contracts_new[key] = EmployeeContract(person=person, start=key[1], end=key[2], **values)
+            EmployeeContract.objects.bulk_create(contracts_new.values(), batch_size=batch_size)
+            EmployeeContract.objects.bulk_update(contracts_changed, CONTRACT_FIELDS, batch_size=batch_size)
+
+            # bulk queries do not send any signals
+            changed = list(contracts_new.values()) + contracts_changed
+            if changed:
+                MonthlyFact.objects.invalidate(min(c.start for c in changed), max(c.end for c in changed))
+
+            if new_areas or new_qualifications or employees_new or changed:
+                version_bump_on_commit(DATA_VERSION)
+
+            if options["dry_run"]:
+                transaction.set_rollback(True)
+
+        rows = len(data["mitarbeiter"]) + len(contracts_data)
+        duration = time.perf_counter() - time_start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'Dry run' if options['dry_run'] else 'Done'}: "
+                f"areas: {len(new_areas)} created, "
+                f"qualifications: {len(new_qualifications)} created, "
+                f"employees: {len(employees_new)} created, "
+                f"contracts: {len(contracts_new)} created, {len(contracts_changed)} updated "
+                f"({rows} rows in {duration:.2f}s, {rows / duration:.0f} rows/s)"
             )
-            print(e, created)
-            for c in employee["contracts"]:
-                if c["area"] == "Sonstiges":
-                    area, created = Area.objects.get_or_create(name=c["area"], defaults=dict(educational=False))
-                else:
-                    area, created = Area.objects.get_or_create(name=c["area"], defaults=dict(educational=True))
-                qualification, created = EmployeeQualification.objects.get_or_create(name=c["qualification"])
-                ec, created = EmployeeContract.objects.get_or_create(
-                    person=e,
-                    start=c["begin"],
-                    end=c["end"],
-                    area=area,
-                    qualification=qualification,
-                    hours_child=c["hours_child"],
-                    hours_management=c["hours_management"],
-                    hours_team=c["hours_team"],
-                    hours_misc=c["hours_misc"],
-                    pay_plan=plan,
-                    pay_group=c["pay_group"],
-                    pay_level=c["pay_level"],
-                )
-                print(ec, created)
-
-        self.stdout.write(self.style.SUCCESS("Done"))
+        )
@@ -1,8 +1,10 @@
 import argparse
+from decimal import Decimal
 from django.core.management.base import BaseCommand
-from kitamanager.models import EmployeePaymentPlan, EmployeePaymentTable, EmployeePaymentTableEntry
-
-import yaml
+from django.db import transaction
+from kitamanager.cache import DATA_VERSION, version_bump_on_commit
+from kitamanager.models import EmployeePaymentPlan, EmployeePaymentTable, EmployeePaymentTableEntry, MonthlyFact
+from kitamanager.management.commands._common import diff_objects, yaml_date, yaml_load
 
 
 class Command(BaseCommand):
@@ -11,28 +13,75 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("paymentplan-name", type=str)
         parser.add_argument("payment-file", type=argparse.FileType("r"))
+        parser.add_argument("--dry-run", action="store_true", help="import everything but rollback at the end")
 
     def handle(self, *args, **options):
-        paymentplan_name = options["paymentplan-name"]
-        data = yaml.safe_load(options["payment-file"])
+        data = yaml_load(options["payment-file"])
 
-        plan, created = EmployeePaymentPlan.objects.get_or_create(name=paymentplan_name)
-        self.stdout.write(self.style.SUCCESS(f"Using plan {plan} (newly created? {created})"))
+        with transaction.atomic():
+            # signals (eg. from deleted entries) only invalidate the monthly facts once
+            with MonthlyFact.objects.deferred_invalidation():
+                plan, created = EmployeePaymentPlan.objects.get_or_create(name=options["paymentplan-name"])
 
-        for el in data:
-            table, created = EmployeePaymentTable.objects.get_or_create(
-                plan=plan, start=el["from"], end=el["to"], hours=el["hours"]
-            )
-            self.stdout.write(self.style.SUCCESS(f"{plan}: Using table >{table}< (newly created? {created})"))
+                # tables (keyed by start and end). Tables which are not in the file are kept
+                tables = {(t.start, t.end): t for t in plan.tables.all()}
+                tables_wanted = {
+                    (yaml_date(el["from"]), yaml_date(el["to"])): dict(hours=Decimal(str(el["hours"]))) for el in data
+                }
+                tables_create, tables_changed, _ = diff_objects(tables, tables_wanted)
+                tables_new = [
+                    EmployeePaymentTable(plan=plan, start=k[0], end=k[1], **tables_wanted[k]) for k in tables_create
+                ]
+                EmployeePaymentTable.objects.bulk_create(tables_new)
+                EmployeePaymentTable.objects.bulk_update(tables_changed, ["hours"])
+                tables.update({(t.start, t.end): t for t in tables_new})
 
-            for pay_group, value in el["entries"].items():
-                for pay_level, salary in el["entries"][pay_group].items():
-                    table_entry, created = EmployeePaymentTableEntry.objects.get_or_create(
-                        table=table, pay_group=pay_group, pay_level=pay_level, salary=salary
-                    )
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f"{plan}: table {table}: {pay_group}/{pay_level}: {salary} (newly created? {created})"
-                        )
+                # entries (keyed by table, pay group and pay level) of all tables in the file
+                table_pks = [tables[k].pk for k in tables_wanted]
+                entries = {
+                    (e.table_id, e.pay_group, e.pay_level): e
+                    for e in EmployeePaymentTableEntry.objects.filter(table__in=table_pks)
+                }
+                entries_wanted = dict()
+                for el in data:
+                    table = tables[(yaml_date(el["from"]), yaml_date(el["to"]))]
+                    for pay_group, levels in el["entries"].items():
+                        for pay_level, salary in levels.items():
+                            entries_wanted[(table.pk, int(pay_group), int(pay_level))] = dict(
+                                salary=Decimal(str(salary))
+                            )
+                entries_create, entries_changed, entries_deleted = diff_objects(entries, entries_wanted)
+                EmployeePaymentTableEntry.objects.bulk_create(
+                    [
+                        EmployeePaymentTableEntry(table_id=k[0], pay_group=k[1], pay_level=k[2], **entries_wanted[k])
+                        for k in entries_create
+                    ]
+                )
+                EmployeePaymentTableEntry.objects.bulk_update(entries_changed, ["salary"])
+                EmployeePaymentTableEntry.objects.filter(pk__in=[e.pk for e in entries_deleted]).delete()
+
+                # bulk queries do not send any signals
+                tables_by_pk = {t.pk: t for t in tables.values()}
+                changed_tables = {t.pk: t for t in tables_new + tables_changed}
+                for table_pk in [k[0] for k in entries_create] + [e.table_id for e in entries_changed]:
+                    changed_tables[table_pk] = tables_by_pk[table_pk]
+                if changed_tables:
+                    MonthlyFact.objects.invalidate(
+                        min(t.start for t in changed_tables.values()), max(t.end for t in changed_tables.values())
                     )
-        self.stdout.write(self.style.SUCCESS("Done"))
+
+            if created or changed_tables or entries_deleted:
+                version_bump_on_commit(DATA_VERSION)
+
+            if options["dry_run"]:
+                transaction.set_rollback(True)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'Dry run' if options['dry_run'] else 'Done'}: plan {plan} (newly created? {created}), "
+                f"tables: {len(tables_new)} created, {len(tables_changed)} updated, "
+                f"entries: {len(entries_create)} created, {len(entries_changed)} updated, "
+                f"{len(entries_deleted)} deleted, "
+                f"{len(entries_wanted) - len(entries_create) - len(entries_changed)} unchanged"
+            )
+        )
@@ -0,0 +1,49 @@
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Measure the import time (per module) of a django startup (see 'python -X importtime')"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "module",
+            nargs="*",
+            help="modules imported after django.setup() (default: the ROOT_URLCONF)",
+        )
+        parser.add_argument("--limit", type=int, default=25, help="number of modules to report")
+        parser.add_argument(
+            "--sort",
+            choices=["cumulative", "self"],
+            default="cumulative",
+            help="sort by the cumulative (including imported modules) or the module's own import time",
+        )
+
+    def handle(self, *args, **options):
+        modules = options["module"] or [settings.ROOT_URLCONF]
+        code = "import django; django.setup(); " + "; ".join(f"import {module}" for module in modules)
+        # a fresh interpreter, everything in this process is already imported
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f"Importing {', '.join(modules)} failed:\n{result.stderr}")
+
+        # lines look like "import time:       239 |      10411 |   django.urls" (times in us)
+        times = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            self_us, cumulative_us, name = line[len("import time:") :].split("|")
+            if not self_us.strip().isdigit():
+                # the header
+                continue
+            depth = (len(name) - len(name.lstrip())) // 2
+            times.append((name.strip(), int(self_us), int(cumulative_us), depth))
+
+        total = sum(t[2] for t in times if t[3] == 0)
+        self.stdout.write(f"{len(times)} modules imported in {total / 1000:.1f}ms")
+        self.stdout.write(f"{'self [ms]':>10} {'cumulative [ms]':>16}  module")
+        key = 2 if options["sort"] == "cumulative" else 1
+        for name, self_us, cumulative_us, _ in sorted(times, key=lambda t: t[key], reverse=True)[: options["limit"]]:
+            self.stdout.write(f"{self_us / 1000:>10.1f} {cumulative_us / 1000:>16.1f}  {name}")
@@ -1,8 +1,12 @@
 import os
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from kitamanager.cache import DATA_VERSION, version_bump_on_commit
 from kitamanager.models import RevenueName, RevenueEntry
-from kitamanager.berlin import BerlinInvoice
+from kitamanager.berlin import read_invoice_pay
 from kitamanager.definitions import REVENUE_NAME_BERLIN
+from kitamanager.management.commands._common import diff_objects
+from kitamanager.parallel import parallel_map
 from dateutil.relativedelta import relativedelta
 
 
@@ -11,28 +15,57 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("file-path")
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="number of processes used to read the .xlsx files (default: number of CPUs)",
+        )
 
     def handle(self, *args, **options):
         file_path_list = []
         if os.path.isdir(options["file-path"]):
-            file_path_list = [
+            file_path_list = sorted(
                 os.path.join(options["file-path"], path)
                 for path in os.listdir(options["file-path"])
                 if path.endswith(".xlsx")
-            ]
+            )
         elif options["file-path"].endswith(".xlsx"):
             file_path_list = [options["file-path"]]
 
-        # get or create RevenueName
-        revenue_name, created = RevenueName.objects.get_or_create(name=REVENUE_NAME_BERLIN)
+        # reading (and evaluating) a workbook is slow, so read them in parallel (in spawned
+        # processes, a single file is read within this process)
+        jobs = max(1, min(options["jobs"], len(file_path_list)))
+        invoices = parallel_map(read_invoice_pay, file_path_list, jobs=jobs)
+
+        with transaction.atomic():
+            # get or create RevenueName
+            revenue_name, created = RevenueName.objects.get_or_create(name=REVENUE_NAME_BERLIN)
+
+            entries = {(e.start, e.end): e for e in revenue_name.entries.all()}
+            entries_wanted = dict()
+            for file_path, (date, pay) in zip(file_path_list, invoices):
+                entries_wanted[(date, date + relativedelta(months=1))] = dict(
+                    pay=pay, comment=f"Imported from {os.path.basename(file_path)}"
+                )
+            entries_create, entries_changed, _ = diff_objects(entries, entries_wanted)
+            entries_new = [
+                RevenueEntry(name=revenue_name, start=k[0], end=k[1], **entries_wanted[k]) for k in entries_create
+            ]
+            RevenueEntry.objects.bulk_create(entries_new)
+            RevenueEntry.objects.bulk_update(entries_changed, ["pay", "comment"])
 
-        for file_path in file_path_list:
-            invoice = BerlinInvoice(file_path)
-            kwargs = dict(name=revenue_name, start=invoice.date, end=invoice.date + relativedelta(months=1))
-            defaults = dict(pay=invoice.pay, comment=f"Imported from {os.path.basename(file_path)}")
+            # bulk queries do not send any signals
+            if entries_new or entries_changed:
+                version_bump_on_commit(DATA_VERSION)
 
-            re, created = RevenueEntry.objects.update_or_create(defaults, **kwargs)
-            if created:
-                self.stdout.write(f"{re} created")
-            else:
-                self.stdout.write(f"{re} updated")
+        for re in entries_new:
+            self.stdout.write(f"{re} created")
+        for re in entries_changed:
+            self.stdout.write(f"{re} updated")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done: {len(file_path_list)} files read with {jobs} jobs, "
+                f"{len(entries_new)} created, {len(entries_changed)} updated"
+            )
+        )
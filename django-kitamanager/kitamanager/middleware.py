@@ -0,0 +1,132 @@
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from django.conf import settings
+from django.db import connections
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+# slow queries (see KITAMANAGER_SLOW_QUERY_MS)
+sql_logger = logging.getLogger("kitamanager.sql")
+
+
+@dataclass
+class QueryStats:
+    """
+    Aggregated query statistics for a single view (by the resolved URL name)
+    """
+
+    requests: int = 0
+    queries: int = 0
+    queries_max: int = 0
+    sql_time: float = 0.0
+    time: float = 0.0
+
+    def add(self, queries: int, sql_time: float, wall_time: float) -> None:
+        self.requests += 1
+        self.queries += queries
+        self.queries_max = max(self.queries_max, queries)
+        self.sql_time += sql_time
+        self.time += wall_time
+
+
+_stats: Dict[str, QueryStats] = dict()
+_stats_lock = threading.Lock()
+
+
+def query_stats() -> Dict[str, QueryStats]:
+    """
+    A copy of the statistics (for this process) collected by the QueryStatsMiddleware
+    :return: a dict with the URL name as key and the QueryStats as value
+    """
+    with _stats_lock:
+        return {name: QueryStats(**vars(stats)) for name, stats in _stats.items()}
+
+
+def query_stats_reset() -> None:
+    """
+    Forget all collected statistics
+    """
+    with _stats_lock:
+        _stats.clear()
+
+
+class _QueryRecorder:
+    """
+    A database execute wrapper which counts the queries and sums up the time spent in the database
+    Queries slower than the KITAMANAGER_SLOW_QUERY_MS setting (0 for every query, a negative value
+    disables it) are logged together with the view name. Only a sample of them is logged when
+    KITAMANAGER_SLOW_QUERY_SAMPLE_RATE (0.0 - 1.0) is below 1
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.queries = 0
+        self.sql_time = 0.0
+        slow_ms = getattr(settings, "KITAMANAGER_SLOW_QUERY_MS", -1)
+        self.slow = slow_ms / 1000 if slow_ms >= 0 else None
+        self.sample_rate = getattr(settings, "KITAMANAGER_SLOW_QUERY_SAMPLE_RATE", 1.0)
+
+    def _view_name(self) -> str:
+        match = getattr(self.request, "resolver_match", None)
+        return match.view_name if match else self.request.path
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.sql_time += duration
+            self.queries += 1
+            if self.slow is not None and duration >= self.slow and random.random() < self.sample_rate:
+                # lazy formatting: the (possibly long) statement is only formatted when it is written
+                sql_logger.info("%s: %.1fms %s; args=%s", self._view_name(), duration * 1000, sql, params)
+
+
+class QueryStatsMiddleware:
+    """
+    Record the number of queries, the SQL time and the wall time of each request
+    The values are added as Server-Timing header to the response and aggregated (per resolved URL name)
+    in memory (see query_stats()). A warning is logged when a view runs more queries than its
+    budget in the KITAMANAGER_QUERY_BUDGETS setting (a dict with the URL name as key,
+    eg. {"child-list": 10} or {"kitamanager:child-list": 10})
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def _budget(view_name: str, url_name: str) -> Optional[int]:
+        budgets = getattr(settings, "KITAMANAGER_QUERY_BUDGETS", dict())
+        return budgets.get(view_name, budgets.get(url_name))
+
+    def __call__(self, request):
+        recorder = _QueryRecorder(request)
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            # queries of a streaming response (run while the content is sent) are not included
+            response = self.get_response(request)
+        wall_time = time.perf_counter() - start
+
+        response["Server-Timing"] = (
+            f'sql;dur={recorder.sql_time * 1000:.1f};desc="{recorder.queries} queries", '
+            f"total;dur={wall_time * 1000:.1f}"
+        )
+
+        match = getattr(request, "resolver_match", None)
+        if match and match.url_name:
+            with _stats_lock:
+                _stats.setdefault(match.view_name, QueryStats()).add(recorder.queries, recorder.sql_time, wall_time)
+            budget = self._budget(match.view_name, match.url_name)
+            if budget is not None and recorder.queries > budget:
+                logger.warning(
+                    f"{match.view_name} ({request.path}) ran {recorder.queries} queries (budget: {budget}) "
+                    f"in {recorder.sql_time * 1000:.1f}ms"
+                )
+        return response
@@ -0,0 +1,138 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:30
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("kitamanager", "0004_alter_childpaymenttableentry_options_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MonthlyFact",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField(help_text="first day of the month")),
+                (
+                    "children",
+                    models.PositiveIntegerField(
+                        default=0, help_text="number of children"
+                    ),
+                ),
+                (
+                    "payments",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0"),
+                        help_text="sum of child payments (in Euro)",
+                        max_digits=12,
+                    ),
+                ),
+                (
+                    "requirements",
+                    models.DecimalField(
+                        decimal_places=3,
+                        default=Decimal("0"),
+                        help_text="sum of child requirements",
+                        max_digits=10,
+                    ),
+                ),
+                (
+                    "requirements_hours",
+                    models.DecimalField(
+                        decimal_places=5,
+                        default=Decimal("0"),
+                        help_text="sum of child requirements (in h/week)",
+                        max_digits=15,
+                    ),
+                ),
+                (
+                    "employees",
+                    models.PositiveIntegerField(
+                        default=0, help_text="number of employees"
+                    ),
+                ),
+                (
+                    "employee_hours_child",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0"),
+                        help_text="working hours per week (children)",
+                        max_digits=10,
+                    ),
+                ),
+                (
+                    "employee_hours_management",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0"),
+                        help_text="working hours per week (management)",
+                        max_digits=10,
+                    ),
+                ),
+                (
+                    "employee_hours_team",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0"),
+                        help_text="working hours per week (team)",
+                        max_digits=10,
+                    ),
+                ),
+                (
+                    "employee_hours_misc",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0"),
+                        help_text="working hours per week (miscellaneous)",
+                        max_digits=10,
+                    ),
+                ),
+                (
+                    "salaries",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0"),
+                        help_text="sum of monthly salaries (in Euro)",
+                        max_digits=12,
+                    ),
+                ),
+                (
+                    "area",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="area (empty for all areas)",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="kitamanager.area",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["month", "area"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("month", "area"),
+                        name="kitamanager_monthlyfact_month_area",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("area__isnull", True)),
+                        fields=("month",),
+                        name="kitamanager_monthlyfact_month_all_areas",
+                    ),
+                ],
+            },
+        ),
+    ]
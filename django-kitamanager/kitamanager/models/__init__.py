@@ -6,3 +6,4 @@ from .bank import BankAccount, BankAccountEntry
 from .child import Child, ChildContract
 from .child_payment import ChildPaymentPlan, ChildPaymentTable, ChildPaymentTableEntry
 from .revenue import RevenueName, RevenueEntry
+from .monthly_fact import MonthlyFact
@@ -1,13 +1,12 @@
 import datetime
-from django.db import models
+from django.db import connection, models
 from django.utils.translation import gettext_lazy as _
 from django.contrib.postgres.fields import RangeOperators, RangeBoundary
 from django.contrib.postgres.constraints import ExclusionConstraint
-from dateutil.relativedelta import relativedelta
 from django.core.exceptions import ValidationError
 from typing import Dict
 from decimal import Decimal
-from kitamanager.models.common import DateRange
+from kitamanager.models.common import DateRange, month_series_sql
 
 
 class BankAccount(models.Model):
@@ -43,15 +42,48 @@ class BankAccountEntryManager(models.Manager):
         """
         return self.by_date(date).aggregate(balance_sum=models.Sum("balance", default=0))
 
+    def _sum_balance_by_month(self, date_start: datetime.date, date_end: datetime.date, group_by_bankaccount: bool):
+        """
+        Sum of balances for each month (and bank account) with a single query
+        :return: a list of (month, bankaccount, balance_sum) tuples ordered by month.
+            bankaccount is None if not grouped
+        """
+        # date_end is included
+        months_sql, params = month_series_sql(date_start, date_end + datetime.timedelta(days=1))
+        qn = connection.ops.quote_name
+        bankaccount = f"e.{qn('bankaccount_id')}" if group_by_bankaccount else "NULL"
+        sql = (
+            f"SELECT m.month, {bankaccount}, COALESCE(SUM(e.{qn('balance')}), 0) FROM ({months_sql}) AS m "
+            f"LEFT JOIN {qn(self.model._meta.db_table)} AS e "
+            f"ON e.{qn('start')} <= m.month AND e.{qn('end')} > m.month "
+            "GROUP BY 1, 2 ORDER BY 1"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
     def sum_balance_by_month(self, date_start: datetime.date, date_end: datetime.date):
         """
         Sum of all balances for all bank accounts for each month between date_start and date_end
         """
         data: Dict[datetime.date, Decimal] = dict()
-        d: datetime.date = date_start
-        while d <= date_end:
-            data[d] = self.sum_balance(d)["balance_sum"]
-            d = d + relativedelta(months=1)
+        for month, _bankaccount, balance_sum in self._sum_balance_by_month(date_start, date_end, False):
+            data[month] = balance_sum
+        return data
+
+    def sum_balance_by_month_group_by_bankaccount(self, date_start: datetime.date, date_end: datetime.date):
+        """
+        Sum of balances for each month between date_start and date_end grouped by bank account
+        Only bank accounts with at least a single entry within the given range are included
+        :return: a dict with the bank account name as key and the same structure as
+            sum_balance_by_month() as value
+        """
+        rows = self._sum_balance_by_month(date_start, date_end, True)
+        months = sorted({month for month, _, _ in rows})
+        balances = {(month, ba): balance_sum for month, ba, balance_sum in rows if ba is not None}
+        data: Dict[str, Dict[datetime.date, Decimal]] = dict()
+        for ba in sorted({ba for _, ba in balances}):
+            data[ba] = {month: balances.get((month, ba), Decimal("0")) for month in months}
         return data
 
 
@@ -1,14 +1,15 @@
 import datetime
 from django.urls import reverse
 from django.db import models
+from django.db.models import OuterRef, Subquery
 from django.utils.translation import gettext_lazy as _
 from django.contrib.postgres.fields import ArrayField
 import logging
-from kitamanager.models.person import Person, PersonContract, PersonContractManager
-from kitamanager.models.child_payment import ChildPaymentTable, ChildPaymentTableEntry
+from kitamanager.models.person import Person, PersonContract, PersonContractManager, age
+from kitamanager.models.child_payment import ChildPaymentRates, ChildPaymentTable, ChildPaymentTableEntry
+from kitamanager.models.common import Age, ArrayAny, sweep_months
 from decimal import Decimal
-from dateutil.relativedelta import relativedelta
-from typing import Dict, List
+from typing import Iterator, List, Optional, Tuple
 
 
 logger = logging.getLogger(__name__)
@@ -25,17 +26,100 @@ class Child(Person):
         return reverse("kitamanager:child-detail", args=[self.pk])
 
 
-class ChildContractManager(PersonContractManager):
+class ChildContractQuerySet(models.QuerySet):
+    def _entries(self, date: datetime.date):
+        """
+        The ChildPaymentTableEntry's matching an (outer) contract at the given date
+        To be used as a subquery
+        """
+        age = Age(models.Value(date, output_field=models.DateField()), OuterRef("person__birth_date"))
+        return (
+            ChildPaymentTableEntry.objects.filter(
+                table__plan=OuterRef("pay_plan"),
+                table__start__lte=date,
+                table__end__gt=date,
+                age_start__lte=age,
+                age_end__gte=age,
+            )
+            # implicitly assume that every child also has the "base" tag
+            .filter(models.Q(name="base") | models.Q(ArrayAny(models.F("name"), OuterRef("pay_tags"))))
+            .order_by()
+            .values("table")
+        )
+
+    def with_payment(self, date: datetime.date):
+        """
+        Annotate every contract with the payment for the given date as "payment_sum"
+        (and the date itself as "payment_date").
+        This is the set based version of ChildContract.payment() and is
+        done with a single query for all contracts
+        :param date: the date
+        :type date: datetime.date
+        """
+        entries = self._entries(date).annotate(pay_sum=models.Sum("pay")).values("pay_sum")
+        return self.annotate(
+            payment_sum=Subquery(entries, output_field=models.DecimalField()),
+            payment_date=models.Value(date, output_field=models.DateField()),
+        )
+
+    def with_requirement(self, date: datetime.date):
+        """
+        Annotate every contract with the requirement for the given date as "requirement_sum",
+        the weekly hours for full time work of the matching ChildPaymentTable as "requirement_hours"
+        (and the date itself as "requirement_date").
+        This is the set based version of ChildContract.requirement() and is
+        done with a single query for all contracts
+        :param date: the date
+        :type date: datetime.date
+        """
+        entries = self._entries(date).annotate(requirement_sum=models.Sum("requirement")).values("requirement_sum")
+        table = ChildPaymentTable.objects.filter(plan=OuterRef("pay_plan"), start__lte=date, end__gt=date)
+        return self.annotate(
+            requirement_sum=Subquery(entries, output_field=models.DecimalField()),
+            requirement_hours=Subquery(table.values("hours")[:1], output_field=models.DecimalField()),
+            requirement_date=models.Value(date, output_field=models.DateField()),
+        )
+
+
+class ChildContractManager(PersonContractManager.from_queryset(ChildContractQuerySet)):  # type: ignore[misc]
     def sum_payments(self, date: datetime.date):
         """
         Sum of all payments for the given date
         """
-        payments = Decimal("0")
-        for c in self.by_date(date):
-            p = c.payment(date)
-            if p:
-                payments += p
-        return payments
+        return (
+            self.by_date(date)
+            .with_payment(date)
+            .aggregate(payments=models.Sum("payment_sum", default=Decimal("0")))["payments"]
+        )
+
+    def priced_by_month(
+        self, months: List[datetime.date]
+    ) -> Iterator[Tuple[datetime.date, List[Tuple[str, Optional[Decimal], Optional[Tuple[Decimal, Decimal]]]]]]:
+        """
+        Sweep over the given (ascending) months and yield each month together with the active
+        contracts priced with the compiled ChildPaymentRates as (area, payment, requirement) tuples
+        (payment and requirement like ChildContract.payment() and ChildContract.requirement() return them)
+        All contracts overlapping the months are loaded with a single query
+        (so age changes and table boundaries are handled for each month)
+        :param months: the (ascending) dates to price the contracts for
+        :type months: List[datetime.date]
+        """
+        if not months:
+            return
+        contracts = (
+            self.filter(start__lte=months[-1], end__gt=months[0])
+            .order_by()
+            .values_list("start", "end", "area", "pay_plan", "pay_tags", "person__birth_date")
+        )
+        for month, active in sweep_months(contracts, months):
+            priced = []
+            for _start, _end, area, pay_plan, pay_tags, birth_date in active:
+                rates = ChildPaymentRates.for_plan(pay_plan)
+                child_age = age(birth_date, month)
+                priced.append(
+                    (area, rates.payment(month, child_age, pay_tags), rates.requirement(month, child_age, pay_tags))
+                )
+            yield month, priced
 
     def sum_requirements(self, date: datetime.date):
         """
@@ -47,32 +131,12 @@ class ChildContractManager(PersonContractManager):
         """
         requirements = Decimal("0")
         requirements_hours_per_week = Decimal("0")
-        for c in self.by_date(date):
-            r = c.requirement(date)
-            if r:
-                requirements += r[0]
-                requirements_hours_per_week += r[0] * r[1]
+        for r, hours in self.by_date(date).with_requirement(date).values_list("requirement_sum", "requirement_hours"):
+            if r and hours is not None:
+                requirements += r
+                requirements_hours_per_week += r * hours
         return requirements, requirements_hours_per_week
 
-    def count_by_month(self, from_dt: datetime.date, to_dt: datetime.date) -> Dict[int, List[int]]:
-        """
-        Children count by month
-        param from_dt: the date to start with (date included)
-        type from_dt: datetime.date
-        param to_dt: the date to end with (date excluded)
-        type from_dt: datetime.date
-        """
-        data = dict()  # type: Dict[int, List[int]]
-        current = from_dt
-        while current < to_dt:
-            # total amount of children for that current date
-            children_total = self.by_date(current).count()
-            if not data.get(current.year):
-                data[current.year] = []
-            data[current.year].append(children_total)
-            current = current + relativedelta(months=1)
-        return data
-
 
 class ChildContract(PersonContract):
     """
@@ -106,17 +170,7 @@ class ChildContract(PersonContract):
                 f"{self.start} - {self.end} invalid. dates do not match"
             )
 
-        # implicitly assume that every child also has the "base" tag
-        pay_tags_with_base = self.pay_tags + ["base"]
-        qs = ChildPaymentTableEntry.objects.filter(
-            table__plan=self.pay_plan,
-            table__start__lte=date,
-            table__end__gt=date,
-            age_start__lte=self.person.age(date),
-            age_end__gte=self.person.age(date),
-            name__in=pay_tags_with_base,
-        )
-        return qs.aggregate(models.Sum("pay"))["pay__sum"]
+        return ChildPaymentRates.for_plan(self.pay_plan_id).payment(date, self.person.age(date), self.pay_tags)
 
     def requirement(self, date: datetime.date):
         """
@@ -131,21 +185,4 @@ class ChildContract(PersonContract):
                 f"{self.start} - {self.end} invalid. dates do not match"
             )
 
-        # implicitly assume that every child also has the "base" tag
-        pay_tags_with_base = self.pay_tags + ["base"]
-        try:
-            table = ChildPaymentTable.objects.get(plan=self.pay_plan, start__lte=date, end__gt=date)
-        except ChildPaymentTable.DoesNotExist:
-            return None
-
-        qs = ChildPaymentTableEntry.objects.filter(
-            table=table,
-            age_start__lte=self.person.age(date),
-            age_end__gte=self.person.age(date),
-            name__in=pay_tags_with_base,
-        )
-        sum = qs.aggregate(models.Sum("requirement"))["requirement__sum"]
-        if not sum:
-            return None
-
-        return (sum, table.hours)
+        return ChildPaymentRates.for_plan(self.pay_plan_id).requirement(date, self.person.age(date), self.pay_tags)
@@ -1,4 +1,7 @@
+import bisect
 import datetime
+from dataclasses import dataclass, field
+from decimal import Decimal
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.contrib.postgres.fields import RangeOperators, RangeBoundary
@@ -6,6 +9,11 @@ from django.contrib.postgres.constraints import ExclusionConstraint
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.urls import reverse
 from kitamanager.models.common import DateRange
+from kitamanager.cache import version_get
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# name for the version (see kitamanager.cache) of all ChildPaymentRates
+CHILD_PAYMENT_RATES_VERSION = "childpaymentrates"
 
 
 class ChildPaymentPlan(models.Model):
@@ -125,3 +133,106 @@ class ChildPaymentTableEntry(models.Model):
             f"{self.table}: age:{self.age_start}-{self.age_end}, "
             f"name:{self.name}, pay:{self.pay}, req:{self.requirement}"
         )
+
+
+@dataclass
+class ChildPaymentRatesTable:
+    """
+    A compiled ChildPaymentTable
+    """
+
+    start: datetime.date
+    end: datetime.date
+    hours: Decimal
+    # (age, name) -> (pay, requirement), summed up over all entries matching the age and name
+    entries: Dict[Tuple[int, str], Tuple[Decimal, Decimal]] = field(default_factory=dict)
+
+    def lookup(self, age: int, pay_tags: Iterable[str]) -> List[Tuple[Decimal, Decimal]]:
+        """
+        All (pay, requirement) tuples matching the given age and tags
+        """
+        # implicitly assume that every child also has the "base" tag
+        names = set(pay_tags) | {"base"}
+        return [self.entries[(age, name)] for name in names if (age, name) in self.entries]
+
+
+class ChildPaymentRates:
+    """
+    Compiled in-memory lookup structure for all tables of a single ChildPaymentPlan
+    Use ChildPaymentRates.for_plan() to get the (cached) rates for a plan
+    """
+
+    # plan name -> (version, rates). Kept per process
+    _cache: Dict[str, Tuple[int, "ChildPaymentRates"]] = {}
+
+    def __init__(self, tables: Iterable[ChildPaymentRatesTable]):
+        self.tables = sorted(tables, key=lambda t: t.start)
+        self._starts = [t.start for t in self.tables]
+
+    @classmethod
+    def from_db(cls, plan: str) -> "ChildPaymentRates":
+        """
+        Compile the rates for the given plan name from the database
+        """
+        tables: Dict[int, ChildPaymentRatesTable] = {}
+        for t in ChildPaymentTable.objects.filter(plan=plan).order_by():
+            tables[t.pk] = ChildPaymentRatesTable(start=t.start, end=t.end, hours=t.hours)
+        entries = ChildPaymentTableEntry.objects.filter(table__plan=plan).order_by()
+        for e in entries.values_list("table", "age_start", "age_end", "name", "pay", "requirement"):
+            table_pk, age_start, age_end, name, pay, requirement = e
+            for age in range(age_start, age_end + 1):
+                # age ranges of the same name may overlap. All matching entries count (like in payment())
+                sum_pay, sum_requirement = tables[table_pk].entries.get((age, name), (Decimal("0"), Decimal("0")))
+                tables[table_pk].entries[(age, name)] = (sum_pay + pay, sum_requirement + requirement)
+        return cls(tables.values())
+
+    @classmethod
+    def for_plan(cls, plan: str) -> "ChildPaymentRates":
+        """
+        The rates for the given plan name
+        Only compiled again when any payment plan data changed (see kitamanager.signals)
+        """
+        version = version_get(CHILD_PAYMENT_RATES_VERSION)
+        cached = cls._cache.get(plan)
+        if cached and cached[0] == version:
+            return cached[1]
+        rates = cls.from_db(plan)
+        cls._cache[plan] = (version, rates)
+        return rates
+
+    def table(self, date: datetime.date) -> Optional[ChildPaymentRatesTable]:
+        """
+        The table valid at the given date
+        """
+        index = bisect.bisect_right(self._starts, date) - 1
+        if index < 0:
+            return None
+        table = self.tables[index]
+        if date >= table.end:
+            return None
+        return table
+
+    def payment(self, date: datetime.date, age: int, pay_tags: Iterable[str]) -> Optional[Decimal]:
+        """
+        The payment for the given date, age and tags or None if nothing matches
+        """
+        table = self.table(date)
+        if not table:
+            return None
+        matches = table.lookup(age, pay_tags)
+        if not matches:
+            return None
+        return sum((pay for pay, _ in matches), Decimal("0"))
+
+    def requirement(self, date: datetime.date, age: int, pay_tags: Iterable[str]) -> Optional[Tuple[Decimal, Decimal]]:
+        """
+        The requirement and the hours for full time work for the given date, age and tags
+        or None if nothing matches
+        """
+        table = self.table(date)
+        if not table:
+            return None
+        requirement = sum((r for _, r in table.lookup(age, pay_tags)), Decimal("0"))
+        if not requirement:
+            return None
+        return (requirement, table.hours)
@@ -1,8 +1,100 @@
+import datetime
+import heapq
+from dateutil.relativedelta import relativedelta
 from django.contrib.postgres.fields import DateRangeField
-from django.db.models import Func
+from django.db.models import Func, BooleanField, DateField, IntegerField
+from typing import Iterable, Iterator, List, Sequence, Tuple, TypeVar
+
+T = TypeVar("T", bound=Sequence)
 
 
 # see https://docs.djangoproject.com/en/5.0/ref/contrib/postgres/constraints/
 class DateRange(Func):
     function = "DATERANGE"
     output_field = DateRangeField()
+
+
+class Age(Func):
+    """
+    Age in full years at a given date: Age(date, birth_date)
+    This is the SQL version of Person.age()
+    """
+
+    function = "AGE"
+    template = "DATE_PART('year', %(function)s(%(expressions)s))::integer"
+    output_field = IntegerField()
+
+
+class ArrayAny(Func):
+    """
+    Is the value an element of the array: ArrayAny(value, array)
+    """
+
+    arg_joiner = " = ANY("
+    template = "(%(expressions)s))"
+    output_field = BooleanField()
+
+
+class AddYears(Func):
+    """
+    Add a number of years to a date: AddYears(date, years)
+    This is the SQL version of date + relativedelta(years=years)
+    """
+
+    arg_joiner = " + "
+    template = "(%(expressions)s * INTERVAL '1 year')::date"
+    output_field = DateField()
+
+
+def month_series_sql(from_dt: datetime.date, to_dt: datetime.date) -> Tuple[str, List[datetime.date]]:
+    """
+    SQL (and the parameters for it) for a series of monthly dates with a single "month" column,
+    starting at from_dt (included) up to to_dt (excluded). The months are generated the
+    same way as adding relativedelta(months=1) in a loop does.
+    Use it as a subquery, eg. f"SELECT ... FROM ({sql}) AS m JOIN ..."
+    """
+    sql = (
+        "SELECT month::date AS month FROM generate_series(%s::timestamp, %s::timestamp, INTERVAL '1 month') AS month "
+        "WHERE month < %s::timestamp"
+    )
+    return sql, [from_dt, to_dt, to_dt]
+
+
+def sweep_months(items: Iterable[T], months: Iterable[datetime.date]) -> Iterator[Tuple[datetime.date, List[T]]]:
+    """
+    Sweep over the given (ascending) months and yield each month together with the items
+    active at that month. An item is a tuple with the start (included) and the end (excluded)
+    date as the first two elements (eg. a values_list() row of a contract)
+    """
+    items = sorted(items, key=lambda i: i[0])
+    # active items as a heap ordered by the item end
+    active: List[Tuple[datetime.date, int]] = []
+    index = 0
+    for month in months:
+        while index < len(items) and items[index][0] <= month:
+            heapq.heappush(active, (items[index][1], index))
+            index += 1
+        while active and active[0][0] <= month:
+            heapq.heappop(active)
+        yield month, [items[i] for _, i in active]
+
+
+def month_start(d: datetime.date) -> datetime.date:
+    """
+    The first day of the month for the given date
+    """
+    return d.replace(day=1)
+
+
+def months_between(from_dt: datetime.date, to_dt: datetime.date) -> List[datetime.date]:
+    """
+    The first days of all months between from_dt (included) and to_dt (excluded)
+    """
+    months = []
+    current = month_start(from_dt)
+    if current < from_dt:
+        current = current + relativedelta(months=1)
+    while current < to_dt:
+        months.append(current)
+        current = current + relativedelta(months=1)
+    return months
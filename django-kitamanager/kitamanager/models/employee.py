@@ -1,11 +1,13 @@
 import datetime
 from django.urls import reverse
-from django.db import models
+from django.db import connection, models
+from django.db.models import Case, ExpressionWrapper, F, OuterRef, Subquery, Value, When
 from django.utils.translation import gettext_lazy as _
 import logging
 from kitamanager.models.person import Person, PersonContract, PersonContractManager
 from kitamanager.models.employee_payment import EmployeePaymentTable, EmployeePaymentTableEntry
-from typing import Optional, List, Dict
+from kitamanager.models.common import AddYears, month_series_sql
+from typing import Any, Optional, Iterable, List, Dict
 from kitamanager import definitions
 from dateutil.relativedelta import relativedelta
 from decimal import Decimal
@@ -46,40 +48,71 @@ class Employee(Person):
         """
         The salary for a given date
         """
-        try:
-            contract = self.contracts.get(start__lte=date, end__gt=date)
-        except EmployeeContract.DoesNotExist:
-            return None
-        try:
-            pay_plan_table = contract.pay_plan.tables.get(start__lte=date, end__gt=date)
-        except EmployeePaymentTable.DoesNotExist:
-            return None
-        try:
-            pay_plan_table_entry = pay_plan_table.entries.get(
-                pay_level=contract.pay_level, pay_group=contract.pay_group
-            )
-        except EmployeePaymentTableEntry.DoesNotExist:
-            return None
-        return pay_plan_table_entry.salary * contract.hours_total / pay_plan_table.hours
+        return (
+            EmployeeContract.objects.filter(person=self, start__lte=date, end__gt=date)
+            .with_salary(date)
+            .values_list("salary", flat=True)
+            .first()
+        )
 
     def hours_by_month(self, year: int) -> List[Dict[str, Decimal]]:
         """
         Get working hours for each month for the given year
         """
-        data = []
-        for month in range(1, 13, 1):
-            d = datetime.date(year=year, month=month, day=1)
-            hours = Decimal("0.0")
-            hours_fulltime = Decimal("0.0")
-            contract = self.contracts.by_date(d).first()
-            if contract:
-                hours = contract.hours_child + contract.hours_management + contract.hours_team + contract.hours_misc
-                hours_fulltime = contract.pay_plan.tables.get(start__lte=d, end__gt=d).hours
-            data.append({"hours": hours, "hours_fulltime": hours_fulltime})
-        return data
+        return EmployeeContract.objects.hours_by_month(year, persons=[self])[self.pk]
+
+
+class EmployeeContractQuerySet(models.QuerySet):
+    def with_salary(self, date: datetime.date):
+        """
+        Annotate every contract with the payment details for the given date, done with a single query:
+        - "salary": the monthly salary (see Employee.salary())
+        - "table_hours": the weekly working hours of the EmployeePaymentTable valid at the date
+        - "begin_date": the lowest start date of all contracts of the employee (see Person.begin_date)
+        - "pay_level_next": the date of the next pay level (see Employee.pay_level_next())
+        The total weekly working hours are available with the hours_total property.
+        :param date: the date
+        :type date: datetime.date
+        """
+        table = EmployeePaymentTable.objects.filter(plan=OuterRef("pay_plan"), start__lte=date, end__gt=date)
+        entry = EmployeePaymentTableEntry.objects.filter(
+            table__plan=OuterRef("pay_plan"),
+            table__start__lte=date,
+            table__end__gt=date,
+            pay_level=OuterRef("pay_level"),
+            pay_group=OuterRef("pay_group"),
+        )
+        begin_date = (
+            EmployeeContract.objects.filter(person=OuterRef("person"))
+            .order_by()
+            .values("person")
+            .annotate(start_min=models.Min("start"))
+            .values("start_min")
+        )
+        hours_total = F("hours_child") + F("hours_management") + F("hours_team") + F("hours_misc")
+        table_hours = Subquery(table.values("hours")[:1], output_field=models.DecimalField())
+        # the next pay level is reached after the years defined for it (counted from begin_date)
+        pay_levels_max = len(definitions.PAY_LEVEL_BY_YEARS)
+        pay_level_next = Case(
+            When(pay_level=pay_levels_max, then=Value(None)),
+            *[
+                When(pay_level=level, then=AddYears(F("begin_date"), Value(definitions.PAY_LEVEL_BY_YEARS[level + 1])))
+                for level in range(1, pay_levels_max)
+            ],
+            default=AddYears(F("begin_date"), Value(definitions.PAY_LEVEL_BY_YEARS[pay_levels_max])),
+            output_field=models.DateField(),
+        )
+        return self.annotate(
+            table_hours=table_hours,
+            salary=ExpressionWrapper(
+                Subquery(entry.values("salary")[:1]) * hours_total / table_hours,
+                output_field=models.DecimalField(),
+            ),
+            begin_date=Subquery(begin_date, output_field=models.DateField()),
+        ).annotate(pay_level_next=pay_level_next)
 
 
-class EmployeeContractManager(PersonContractManager):
+class EmployeeContractManager(PersonContractManager.from_queryset(EmployeeContractQuerySet)):  # type: ignore[misc]
     def sum_hours(self, date: datetime.date):
         """
         Sum of all type of hours at the given date
@@ -108,18 +141,62 @@ class EmployeeContractManager(PersonContractManager):
                 + models.Sum("hours_team", default=0)
                 + models.Sum("hours_misc", default=0),
             )
+            .order_by("area")
+        )
+
+    def hours_by_month(
+        self, year: int, persons: Optional[Iterable["Employee"]] = None
+    ) -> Dict[int, List[Dict[str, Decimal]]]:
+        """
+        Get working hours and the full time working hours (from the EmployeePaymentTable)
+        for each month (at the first day of the month) of the given year, for all employees
+        with a single query
+        :param year: the year
+        :type year: int
+        :param persons: only get the hours for these employees (all months are included
+            even for employees without any contract in the given year)
+        :type persons: Optional[Iterable[Employee]]
+        :return: a dict with the employee pk as key and a list with a dict for each month as value
+        """
+        months_sql, month_params = month_series_sql(datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1))
+        params: List[Any] = [*month_params]
+        qn = connection.ops.quote_name
+        hours = " + ".join(f"c.{qn(h)}" for h in ["hours_child", "hours_management", "hours_team", "hours_misc"])
+        sql = (
+            f"SELECT c.{qn('person_id')}, EXTRACT(MONTH FROM m.month)::integer, {hours}, t.{qn('hours')} "
+            f"FROM ({months_sql}) AS m "
+            f"JOIN {qn(self.model._meta.db_table)} AS c ON c.{qn('start')} <= m.month AND c.{qn('end')} > m.month "
+            f"LEFT JOIN {qn(EmployeePaymentTable._meta.db_table)} AS t ON t.{qn('plan_id')} = c.{qn('pay_plan_id')} "
+            f"AND t.{qn('start')} <= m.month AND t.{qn('end')} > m.month"
         )
 
+        def _months_empty():
+            return [{"hours": Decimal("0.0"), "hours_fulltime": Decimal("0.0")} for month in range(12)]
+
+        data: Dict[int, List[Dict[str, Decimal]]] = dict()
+        if persons is not None:
+            pks = [p.pk for p in persons]
+            sql += f" WHERE c.{qn('person_id')} = ANY(%s)"
+            params.append(pks)
+            for pk in pks:
+                data[pk] = _months_empty()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for pk, month, hours_sum, hours_fulltime in cursor.fetchall():
+                if pk not in data:
+                    data[pk] = _months_empty()
+                data[pk][month - 1] = {"hours": hours_sum, "hours_fulltime": hours_fulltime or Decimal("0.0")}
+        return data
+
     def sum_salaries(self, date: datetime.date):
         """
         Sum of all salaries for the given date
         """
-        salary = Decimal("0")
-        for c in self.by_date(date):
-            s = c.person.salary(date)
-            if s:
-                salary += s
-        return salary
+        return (
+            self.by_date(date)
+            .with_salary(date)
+            .aggregate(salaries=models.Sum("salary", default=Decimal("0")))["salaries"]
+        )
 
 
 class EmployeeContract(PersonContract):
@@ -0,0 +1,297 @@
+import datetime
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.utils.translation import gettext_lazy as _
+from kitamanager.cache import DATA_VERSION, version_get
+from kitamanager.models.area import Area
+from kitamanager.models.child import ChildContract
+from kitamanager.models.common import months_between
+from kitamanager.models.employee import EmployeeContract
+from kitamanager.models.employee_payment import EmployeePaymentTable, EmployeePaymentTableEntry
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# the (postgres advisory) lock id used to serialize computing and invalidating the MonthlyFacts
+MONTHLY_FACT_LOCK = 0x4B4D4D46
+
+
+@dataclass
+class StaffingMonth:
+    """
+    The required working hours for the children compared with the available employee working hours in a month
+    """
+
+    month: datetime.date
+    # sum of child requirements (in h/week)
+    requirements_hours: Decimal
+    # employee working hours (child + team + management hours only, in h/week)
+    employee_hours: Decimal
+
+    @classmethod
+    def from_fact(cls, fact: "MonthlyFact") -> "StaffingMonth":
+        return cls(
+            month=fact.month,
+            requirements_hours=fact.requirements_hours,
+            employee_hours=fact.employee_hours_child + fact.employee_hours_team + fact.employee_hours_management,
+        )
+
+    @property
+    def gap(self) -> Decimal:
+        """the available minus the required working hours (negative when understaffed)"""
+        return self.employee_hours - self.requirements_hours
+
+    @property
+    def percent(self) -> Decimal:
+        """the employee hours in percent above (or below) 100% of the required hours"""
+        if self.requirements_hours > 0:
+            return (self.employee_hours / self.requirements_hours * 100) - 100
+        return Decimal("0")
+
+
+class MonthlyFactManager(models.Manager):
+    """
+    Custom Manager for the MonthlyFact model
+    """
+
+    _deferred = threading.local()
+
+    def _compute(self, months: List[datetime.date]) -> List["MonthlyFact"]:
+        """
+        Compute the facts for the given (ascending) months
+        """
+        facts: Dict[Tuple[datetime.date, Optional[str]], MonthlyFact] = dict()
+
+        def _fact(month: datetime.date, area: Optional[str]) -> MonthlyFact:
+            if (month, area) not in facts:
+                facts[(month, area)] = MonthlyFact(month=month, area_id=area)
+            return facts[(month, area)]
+
+        # children: all contracts loaded once and priced with the compiled ChildPaymentRates
+        for month, priced in ChildContract.objects.priced_by_month(months):
+            _fact(month, None)
+            for area, payment, requirement in priced:
+                for fact in [_fact(month, None), _fact(month, area)]:
+                    fact.children += 1
+                    fact.payments += payment or Decimal("0")
+                    if requirement:
+                        fact.requirements += requirement[0]
+                        fact.requirements_hours += requirement[0] * requirement[1]
+
+        # employees: hours and salaries for all months with a single query
+        qn = connection.ops.quote_name
+        hours = [f"c.{qn(h)}" for h in ["hours_child", "hours_management", "hours_team", "hours_misc"]]
+        sql = (
+            f"SELECT m.month, c.{qn('area_id')}, COUNT(c.{qn('id')}), "
+            + ", ".join(f"SUM({h})" for h in hours)
+            + f", SUM(e.{qn('salary')} * ({' + '.join(hours)}) / NULLIF(t.{qn('hours')}, 0)) "
+            f"FROM unnest(%s::date[]) AS m(month) "
+            f"JOIN {qn(EmployeeContract._meta.db_table)} AS c "
+            f"ON c.{qn('start')} <= m.month AND c.{qn('end')} > m.month "
+            f"LEFT JOIN {qn(EmployeePaymentTable._meta.db_table)} AS t ON t.{qn('plan_id')} = c.{qn('pay_plan_id')} "
+            f"AND t.{qn('start')} <= m.month AND t.{qn('end')} > m.month "
+            f"LEFT JOIN {qn(EmployeePaymentTableEntry._meta.db_table)} AS e ON e.{qn('table_id')} = t.{qn('id')} "
+            f"AND e.{qn('pay_group')} = c.{qn('pay_group')} AND e.{qn('pay_level')} = c.{qn('pay_level')} "
+            "GROUP BY 1, 2"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [months])
+            for month, area, employees, h_child, h_management, h_team, h_misc, salaries in cursor.fetchall():
+                for fact in [_fact(month, None), _fact(month, area)]:
+                    fact.employees += employees
+                    fact.employee_hours_child += h_child
+                    fact.employee_hours_management += h_management
+                    fact.employee_hours_team += h_team
+                    fact.employee_hours_misc += h_misc
+                    fact.salaries += salaries or Decimal("0")
+        return list(facts.values())
+
+    def _lock(self) -> None:
+        """
+        Serialize computing and invalidating the facts until the end of the current transaction.
+        Without it, facts computed before an invalidation is committed could be stored after it
+        and would be treated as valid forever
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [MONTHLY_FACT_LOCK])
+
+    def update(self, months: Iterable[datetime.date]) -> None:
+        """
+        (Re)compute and store the facts for the given months (first day of a month)
+        """
+        months = sorted(set(months))
+        if not months:
+            return
+        with transaction.atomic():
+            # compute within the locked transaction, so a concurrent invalidate() can not be undone
+            self._lock()
+            facts = self._compute(months)
+            self.filter(month__in=months).delete()
+            self.bulk_create(facts, ignore_conflicts=True)
+
+    def invalidate(self, start: datetime.date, end: datetime.date) -> None:
+        """
+        Drop the facts for all months within start (included) and end (excluded)
+        They are computed again the next time they are requested
+        """
+        if getattr(self._deferred, "ranges", None) is not None:
+            self._deferred.ranges.append((start, end))
+            return
+        with transaction.atomic(savepoint=False):
+            self._lock()
+            self.filter(month__gte=start, month__lt=end).delete()
+
+    @contextmanager
+    def deferred_invalidation(self):
+        """
+        Collect all invalidations (eg. from signals during an import) and
+        drop the facts for the whole collected range once at the end
+        """
+        if getattr(self._deferred, "ranges", None) is not None:
+            # already collecting
+            yield
+            return
+        self._deferred.ranges = []
+        try:
+            yield
+        finally:
+            ranges, self._deferred.ranges = self._deferred.ranges, None
+            if ranges:
+                self.invalidate(min(r[0] for r in ranges), max(r[1] for r in ranges))
+
+    def _by_month(self, from_dt: datetime.date, to_dt: datetime.date):
+        """
+        All facts for the months between from_dt (included) and to_dt (excluded)
+        Missing months are computed and stored first, so reading facts (eg. a GET of a chart) may write
+        to the database (taking the MONTHLY_FACT_LOCK). The database user needs write access and with
+        a read replica the MonthlyFacts have to be routed to the primary database
+        """
+        months = months_between(from_dt, to_dt)
+        existing = set(self.filter(month__in=months, area__isnull=True).values_list("month", flat=True))
+        self.update(m for m in months if m not in existing)
+        return months, self.filter(month__in=months)
+
+    def by_month(self, from_dt: datetime.date, to_dt: datetime.date) -> Dict[datetime.date, "MonthlyFact"]:
+        """
+        The facts (for all areas) for each month between from_dt (included) and to_dt (excluded)
+        The facts are for the first day of each month (whatever the day of from_dt is)
+        :return: a dict with the first day of the month as key and the MonthlyFact as value
+        """
+        months, qs = self._by_month(from_dt, to_dt)
+        facts = {f.month: f for f in qs.filter(area__isnull=True)}
+        return {m: facts[m] for m in months}
+
+    def staffing_series(self, from_dt: datetime.date, to_dt: datetime.date) -> List[StaffingMonth]:
+        """
+        Required vs. available working hours for each month between from_dt (included) and to_dt (excluded)
+        The series is computed once for the current DATA_VERSION and shared (eg. by the statistic charts)
+        """
+        key = f"kitamanager:staffing:{version_get(DATA_VERSION)}:{from_dt.isoformat()}:{to_dt.isoformat()}"
+        series = cache.get(key)
+        if series is None:
+            series = [StaffingMonth.from_fact(fact) for fact in self.by_month(from_dt, to_dt).values()]
+            cache.set(key, series)
+        return series
+
+    def staffing_series_group_by_area(
+        self, from_dt: datetime.date, to_dt: datetime.date
+    ) -> Dict[str, List[StaffingMonth]]:
+        """
+        The staffing series (see staffing_series()) for each educational area
+        Built from the facts per area, so the number of queries does not depend on the number of contracts
+        :return: a dict with the area name as key and the series as value
+        """
+        key = f"kitamanager:staffing-by-area:{version_get(DATA_VERSION)}:{from_dt.isoformat()}:{to_dt.isoformat()}"
+        data = cache.get(key)
+        if data is None:
+            facts = self.by_month_group_by_area(from_dt, to_dt)
+            months = months_between(from_dt, to_dt)
+            data = dict()
+            for area in Area.objects.filter(educational=True).order_by("name").values_list("name", flat=True):
+                area_facts = facts.get(area, dict())
+                data[area] = [
+                    StaffingMonth.from_fact(area_facts.get(m) or MonthlyFact(month=m, area_id=area)) for m in months
+                ]
+            cache.set(key, data)
+        return data
+
+    def by_month_group_by_area(
+        self, from_dt: datetime.date, to_dt: datetime.date
+    ) -> Dict[str, Dict[datetime.date, "MonthlyFact"]]:
+        """
+        The facts for each month between from_dt (included) and to_dt (excluded) grouped by area
+        Only areas with at least a single fact within the given range are included
+        :return: a dict with the area name as key and the same structure as by_month() as value
+        """
+        months, qs = self._by_month(from_dt, to_dt)
+        data: Dict[str, Dict[datetime.date, MonthlyFact]] = dict()
+        for f in qs.filter(area__isnull=False).order_by("area_id", "month"):
+            data.setdefault(f.area_id, dict())[f.month] = f
+        for area, facts in data.items():
+            for m in months:
+                if m not in facts:
+                    facts[m] = MonthlyFact(month=m, area_id=area)
+            data[area] = dict(sorted(facts.items()))
+        return data
+
+
+class MonthlyFact(models.Model):
+    """
+    Precomputed aggregates for a single month (at the first day of the month) and area.
+    The row without an area contains the aggregates for all areas.
+    Maintained by MonthlyFactManager.invalidate() (see kitamanager.signals) and
+    computed again on demand
+    """
+
+    month = models.DateField(help_text=_("first day of the month"))
+    area = models.ForeignKey(
+        "Area", on_delete=models.CASCADE, null=True, blank=True, help_text=_("area (empty for all areas)")
+    )
+    children = models.PositiveIntegerField(default=0, help_text=_("number of children"))
+    payments = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0"), help_text=_("sum of child payments (in Euro)")
+    )
+    requirements = models.DecimalField(
+        max_digits=10, decimal_places=3, default=Decimal("0"), help_text=_("sum of child requirements")
+    )
+    requirements_hours = models.DecimalField(
+        max_digits=15, decimal_places=5, default=Decimal("0"), help_text=_("sum of child requirements (in h/week)")
+    )
+    employees = models.PositiveIntegerField(default=0, help_text=_("number of employees"))
+    employee_hours_child = models.DecimalField(
+        max_digits=10, decimal_places=2, default=Decimal("0"), help_text=_("working hours per week (children)")
+    )
+    employee_hours_management = models.DecimalField(
+        max_digits=10, decimal_places=2, default=Decimal("0"), help_text=_("working hours per week (management)")
+    )
+    employee_hours_team = models.DecimalField(
+        max_digits=10, decimal_places=2, default=Decimal("0"), help_text=_("working hours per week (team)")
+    )
+    employee_hours_misc = models.DecimalField(
+        max_digits=10, decimal_places=2, default=Decimal("0"), help_text=_("working hours per week (miscellaneous)")
+    )
+    salaries = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0"), help_text=_("sum of monthly salaries (in Euro)")
+    )
+
+    # default and custom managers
+    objects = MonthlyFactManager()
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} (area: {self.area_id or '-'})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["month", "area"],
+                name="%(app_label)s_%(class)s_month_area",
+            ),
+            models.UniqueConstraint(
+                fields=["month"],
+                condition=models.Q(area__isnull=True),
+                name="%(app_label)s_%(class)s_month_all_areas",
+            ),
+        ]
+        ordering = ["month", "area"]
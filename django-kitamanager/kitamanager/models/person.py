@@ -8,6 +8,13 @@ from kitamanager.models.common import DateRange
 from typing import Optional
 
 
+def age(birth_date: datetime.date, d: datetime.date) -> int:
+    """
+    The age (in full years) for the given birth date at the given date
+    """
+    return d.year - birth_date.year - ((d.month, d.day) < (birth_date.month, birth_date.day))
+
+
 class PersonManager(models.Manager):
     """
     Custom Manager for the Person model
@@ -72,7 +79,7 @@ class Person(models.Model):
         """
         The Person age for a given date
         """
-        return d.year - self.birth_date.year - ((d.month, d.day) < (self.birth_date.month, self.birth_date.day))
+        return age(self.birth_date, d)
 
 
 class PersonContractManager(models.Manager):
@@ -92,7 +99,7 @@ class PersonContractManager(models.Manager):
         """
         group the number of EmployeeContract for a given date by area
         """
-        return self.by_date(date).values("area").annotate(total=models.Count("area"))
+        return self.by_date(date).values("area").annotate(total=models.Count("area")).order_by("area")
 
 
 class PersonContract(models.Model):
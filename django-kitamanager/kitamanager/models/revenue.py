@@ -1,9 +1,11 @@
 import datetime
+from decimal import Decimal
 from django.db import models
 from django.contrib.postgres.fields import RangeOperators, RangeBoundary
 from django.contrib.postgres.constraints import ExclusionConstraint
 from django.utils.translation import gettext_lazy as _
-from kitamanager.models.common import DateRange
+from kitamanager.models.common import DateRange, months_between, sweep_months
+from typing import Dict, Optional
 
 
 class RevenueName(models.Model):
@@ -37,6 +39,26 @@ class RevenueEntryManager(models.Manager):
         """
         return self.select_related("name").filter(start__lte=date, end__gt=date)
 
+    def pay_by_month(
+        self, name: str, from_dt: datetime.date, to_dt: datetime.date
+    ) -> Dict[datetime.date, Optional[Decimal]]:
+        """
+        The pay of the given RevenueName for each month between from_dt (included) and to_dt (excluded)
+        All entries are loaded with a single query. An entry which spans several months counts for each of them
+        :param name: the RevenueName
+        :return: a dict with the first day of the month as key and the pay (None without an entry) as value
+        """
+        months = months_between(from_dt, to_dt)
+        if not months:
+            return dict()
+        entries = (
+            self.filter(name=name, start__lte=months[-1], end__gt=months[0])
+            .order_by()
+            .values_list("start", "end", "pay")
+        )
+        # entries of the same RevenueName never overlap (see the ExclusionConstraint)
+        return {month: active[0][2] if active else None for month, active in sweep_months(entries, months)}
+
 
 class RevenueEntry(models.Model):
     """
@@ -0,0 +1,28 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, TypeVar
+
+T = TypeVar("T")
+
+
+def mp_context():
+    """
+    The multiprocessing context for process pools
+    New processes are spawned (fresh interpreters which only import the called function's module).
+    Forking a process after django is set up (threads, open database connections, ...) is unsafe
+    """
+    return multiprocessing.get_context("spawn")
+
+
+def parallel_map(fn: Callable[..., T], *iterables: Iterable, jobs: int) -> List[T]:
+    """
+    Like list(map(fn, *iterables)) but with up to jobs processes
+    Starting a process is expensive (about 0.25s for an interpreter importing the module), so with
+    jobs <= 1 everything is done within the current process
+    :param fn: a module level function (it is pickled)
+    :param jobs: the maximum number of processes
+    """
+    if jobs <= 1:
+        return list(map(fn, *iterables))
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=mp_context()) as executor:
+        return list(executor.map(fn, *iterables))
@@ -1,7 +1,64 @@
+import datetime
+import re
 from dataclasses import dataclass
-from dateparser import parse
+from functools import cached_property
+from io import BytesIO
 from pypdf import PdfReader
 from decimal import Decimal
+from typing import List, Optional
+from kitamanager.parallel import parallel_map
+
+# german month names (and the abbreviations) used by Sage
+MONTHS = {
+    "januar": 1,
+    "jan": 1,
+    "februar": 2,
+    "feb": 2,
+    "märz": 3,
+    "maerz": 3,
+    "mär": 3,
+    "mrz": 3,
+    "april": 4,
+    "apr": 4,
+    "mai": 5,
+    "juni": 6,
+    "jun": 6,
+    "juli": 7,
+    "jul": 7,
+    "august": 8,
+    "aug": 8,
+    "september": 9,
+    "sept": 9,
+    "sep": 9,
+    "oktober": 10,
+    "okt": 10,
+    "november": 11,
+    "nov": 11,
+    "dezember": 12,
+    "dez": 12,
+}
+_MONTH_NAME_RE = re.compile(r"^\s*([^\W\d_]+)\.?\s+(\d{4})\s*$")
+_MONTH_NUMBER_RE = re.compile(r"^\s*(\d{1,2})\s*[./-]\s*(\d{4})\s*$")
+
+
+def parse_month(value: str) -> Optional[datetime.datetime]:
+    """
+    Parse a month (eg. "Januar 2025", "Jan. 2025" or "01/2025") as used by Sage
+    Returns the first day of the month. Unknown formats are parsed with dateparser which is
+    imported only then (importing it and loading the language data is slow)
+    :param value: the month string
+    """
+    match = _MONTH_NAME_RE.match(value)
+    if match and match.group(1).lower() in MONTHS:
+        return datetime.datetime(int(match.group(2)), MONTHS[match.group(1).lower()], 1)
+    match = _MONTH_NUMBER_RE.match(value)
+    if match and 1 <= int(match.group(1)) <= 12:
+        return datetime.datetime(int(match.group(2)), int(match.group(1)), 1)
+
+    from dateparser import parse
+
+    date = parse(value)
+    return date.replace(day=1) if date else None
 
 
 @dataclass
@@ -17,23 +74,47 @@ class PayrollPerson:
     pay_level: int
 
 
+def _extract_text(content: bytes, start: int, end: int) -> List[str]:
+    """
+    The text of the pages start (included) to end (excluded) of a PDF file
+    A module level function so it can be used within a process pool
+    """
+    reader = PdfReader(BytesIO(content))
+    return [reader.pages[page_number].extract_text() for page_number in range(start, end)]
+
+
 class SagePayrolls:
     """
     Parse a Sage Payroll (Lohn/Gehaltsabrechnung) PDF file with multiple pages. Each page contains a single person
     The file is expected to be in German and currently very eenemeene specific
     """
 
-    def __init__(self, lohnscheine_path: str):
+    # a process only pays off for many pages (starting it and parsing the file again takes
+    # about 0.5s, extracting a page about 10ms)
+    PAGES_PER_JOB_MIN = 100
+
+    def __init__(self, lohnscheine_path, jobs: int = 1):
+        """
+        :param lohnscheine_path: the .pdf file (a path or a file-like object)
+        :param jobs: maximum number of processes used to extract the text of the pages. Every process
+            costs an interpreter start and parsing the PDF again, so only very large files (eg. in a batch
+            job) profit. The default extracts the pages within the current process (eg. for an upload)
+        """
         self._lohnscheine_path = lohnscheine_path
-        self._reader = PdfReader(self._lohnscheine_path)
-        self._date = None
+        if hasattr(lohnscheine_path, "read"):
+            lohnscheine_path.seek(0)
+            self._content = lohnscheine_path.read()
+        else:
+            with open(lohnscheine_path, "rb") as f:
+                self._content = f.read()
+        self._reader = PdfReader(BytesIO(self._content))
+        self._jobs = jobs
 
     def _get_date(self, text_split):
         for count, line in enumerate(text_split):
             if line.endswith("Abrechnungsmonat:"):
                 date_str = text_split[count + 1].split("#")[0]
-                date = parse(date_str).replace(day=1)
-                return date
+                return parse_month(date_str)
         return None
 
     def _get_person(self, text_split):
@@ -59,26 +140,34 @@ class SagePayrolls:
                 )
         return None
 
-    @property
+    @cached_property
+    def _pages_text(self) -> List[List[str]]:
+        """
+        The lines of every page. With jobs > 1, the pages are split into contiguous chunks
+        (of at least PAGES_PER_JOB_MIN pages) which are extracted in parallel
+        """
+        pages = len(self._reader.pages)
+        jobs = max(1, min(self._jobs, pages // self.PAGES_PER_JOB_MIN))
+        if jobs > 1:
+            bounds = [pages * job // jobs for job in range(jobs + 1)]
+            chunks = parallel_map(_extract_text, [self._content] * jobs, bounds[:-1], bounds[1:], jobs=jobs)
+            texts = [text for chunk in chunks for text in chunk]
+        else:
+            texts = [page.extract_text() for page in self._reader.pages]
+        return [text.splitlines() for text in texts]
+
+    @cached_property
     def date(self):
-        # cache the date
-        if not self._date:
-            # just use the first page and assume that all pages are for the same date
-            page = self._reader.pages[0]
-            text = page.extract_text()
-            text_split = text.splitlines()
-            self._date = self._get_date(text_split)
-        return self._date
-
-    @property
-    def persons(self):
+        # just use the first page and assume that all pages are for the same date
+        return self._get_date(self._pages_text[0])
+
+    @cached_property
+    def persons(self) -> List[PayrollPerson]:
         """
         Parse the different PDF pages and return a list of persons
         """
         persons = []
-        for page_number, page in enumerate(self._reader.pages):
-            text = page.extract_text()
-            text_split = text.splitlines()
+        for text_split in self._pages_text:
             person = self._get_person(text_split)
             if person:
                 persons.append(person)
@@ -0,0 +1,104 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.apps import apps
+from django.dispatch import receiver
+from kitamanager.cache import DATA_VERSION, version_bump_on_commit
+from kitamanager.models import (
+    Child,
+    ChildContract,
+    ChildPaymentPlan,
+    ChildPaymentTable,
+    ChildPaymentTableEntry,
+    EmployeeContract,
+    EmployeePaymentTable,
+    EmployeePaymentTableEntry,
+    MonthlyFact,
+)
+from kitamanager.models.child_payment import CHILD_PAYMENT_RATES_VERSION
+
+
+@receiver([post_save, post_delete], sender=ChildPaymentPlan)
+@receiver([post_save, post_delete], sender=ChildPaymentTable)
+@receiver([post_save, post_delete], sender=ChildPaymentTableEntry)
+def childpayment_changed(sender, **kwargs):
+    """
+    Invalidate the compiled ChildPaymentRates for all worker processes (once the change is committed)
+    """
+    version_bump_on_commit(CHILD_PAYMENT_RATES_VERSION)
+
+
+@receiver(pre_save, sender=ChildContract)
+@receiver(pre_save, sender=EmployeeContract)
+@receiver(pre_save, sender=ChildPaymentTable)
+@receiver(pre_save, sender=EmployeePaymentTable)
+def range_pre_save(sender, instance, **kwargs):
+    """
+    Invalidate the MonthlyFacts for the previous range of a changed contract or payment table
+    """
+    if instance.pk is None:
+        return
+    old = sender.objects.filter(pk=instance.pk).values_list("start", "end").first()
+    if old:
+        MonthlyFact.objects.invalidate(*old)
+
+
+@receiver(pre_save, sender=ChildPaymentTableEntry)
+@receiver(pre_save, sender=EmployeePaymentTableEntry)
+def table_entry_pre_save(sender, instance, **kwargs):
+    """
+    Invalidate the MonthlyFacts for the range of the previous table of a payment table entry
+    which is moved to another table
+    """
+    if instance.pk is None:
+        return
+    old_table_id = sender.objects.filter(pk=instance.pk).values_list("table_id", flat=True).first()
+    if old_table_id is not None and old_table_id != instance.table_id:
+        table_model = sender._meta.get_field("table").related_model
+        table = table_model.objects.filter(pk=old_table_id).values_list("start", "end").first()
+        if table:
+            MonthlyFact.objects.invalidate(*table)
+
+
+@receiver([post_save, post_delete], sender=ChildContract)
+@receiver([post_save, post_delete], sender=EmployeeContract)
+@receiver([post_save, post_delete], sender=ChildPaymentTable)
+@receiver([post_save, post_delete], sender=EmployeePaymentTable)
+def range_changed(sender, instance, **kwargs):
+    """
+    Invalidate the MonthlyFacts for the range of a contract or payment table
+    """
+    MonthlyFact.objects.invalidate(instance.start, instance.end)
+
+
+@receiver([post_save, post_delete], sender=ChildPaymentTableEntry)
+@receiver([post_save, post_delete], sender=EmployeePaymentTableEntry)
+def table_entry_changed(sender, instance, **kwargs):
+    """
+    Invalidate the MonthlyFacts for the range of the table of a payment table entry
+    """
+    table_model = sender._meta.get_field("table").related_model
+    table = table_model.objects.filter(pk=instance.table_id).values_list("start", "end").first()
+    if table:
+        MonthlyFact.objects.invalidate(*table)
+
+
+@receiver(post_save, sender=Child)
+def child_changed(sender, instance, **kwargs):
+    """
+    Invalidate the MonthlyFacts for all contracts of a child (eg. the birth date changed)
+    """
+    for start, end in instance.contracts.values_list("start", "end"):
+        MonthlyFact.objects.invalidate(start, end)
+
+
+def data_changed(sender, **kwargs):
+    """
+    Invalidate all cached responses (see kitamanager.cache.cached_response) once the change is committed
+    """
+    version_bump_on_commit(DATA_VERSION)
+
+
+# every model except the MonthlyFacts (derived data which is maintained by the receivers above)
+for model in apps.get_app_config("kitamanager").get_models():
+    if model is not MonthlyFact:
+        post_save.connect(data_changed, sender=model, dispatch_uid=f"data_changed_save_{model.__name__}")
+        post_delete.connect(data_changed, sender=model, dispatch_uid=f"data_changed_delete_{model.__name__}")
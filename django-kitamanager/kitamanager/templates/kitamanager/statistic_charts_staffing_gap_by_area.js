@@ -0,0 +1,16 @@
+async function statistic_staffing_gap_by_area(historydate) {
+
+    let c = document.getElementById("statisticStaffingGapByAreaChart");
+    let ctx = c.getContext("2d");
+    let statisticStaffingGapByAreaChart = new Chart(ctx, {
+        type: "bar",
+        options: {
+            title: {
+                display: false,
+                text: ""
+            },
+        }
+    });
+    let url = '{% url "kitamanager:statistic-charts-staffing-gap-by-area" %}?historydate=' + historydate
+    await loadChart(statisticStaffingGapByAreaChart, url)
+}
@@ -27,15 +27,33 @@ def salary(obj, date):
 
 @register.filter("payment")
 def payment(obj, date):
+    """
+    The payment of a ChildContract for the given date
+    The "payment_sum" annotation (see ChildContractQuerySet.with_payment()) is only used when it
+    was calculated for the same date. Otherwise the payment is calculated for the single contract
+    """
     if not isinstance(obj, ChildContract):
         raise Exception(f'"payment" template filter expects a "ChildContract" object but got {obj.__class__}')
+    # already calculated for the whole queryset
+    if getattr(obj, "payment_date", None) == date:
+        return obj.payment_sum
     return obj.payment(date)
 
 
 @register.filter("requirement")
 def requirement(obj, date):
+    """
+    The requirement of a ChildContract for the given date
+    The "requirement_sum" annotation (see ChildContractQuerySet.with_requirement()) is only used when it
+    was calculated for the same date. Otherwise the requirement is calculated for the single contract
+    """
     if not isinstance(obj, ChildContract):
         raise Exception(f'"requirement" template filter expects a "ChildContract" object but got {obj.__class__}')
+    # already calculated for the whole queryset
+    if getattr(obj, "requirement_date", None) == date:
+        if not obj.requirement_sum or obj.requirement_hours is None:
+            return None
+        return (obj.requirement_sum, obj.requirement_hours)
     return obj.requirement(date)
 
 
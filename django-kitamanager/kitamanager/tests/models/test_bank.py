@@ -120,3 +120,44 @@ def test_bankaccountentry_sum_balance_by_month():
         parse("2020-01-01").date(): Decimal("130"),
         parse("2020-02-01").date(): Decimal("200"),
     }
+
+
+@pytest.mark.django_db
+def test_bankaccountentry_sum_balance_by_month_group_by_bankaccount(django_assert_num_queries):
+    ba1 = BankAccount.objects.create(name="ba1")
+    BankAccountEntry.objects.create(bankaccount=ba1, start="2020-01-01", end="2020-02-01", balance="100")
+    BankAccountEntry.objects.create(bankaccount=ba1, start="2020-02-01", end="2020-03-01", balance="200")
+    ba2 = BankAccount.objects.create(name="ba2")
+    BankAccountEntry.objects.create(bankaccount=ba2, start="2020-01-01", end="2020-02-01", balance="30")
+
+    # outside of any BankAccountEntry
+    assert (
+        BankAccountEntry.objects.sum_balance_by_month_group_by_bankaccount(
+            parse("2010-01-01").date(), parse("2010-02-01").date()
+        )
+        == {}
+    )
+
+    with django_assert_num_queries(1):
+        data = BankAccountEntry.objects.sum_balance_by_month_group_by_bankaccount(
+            parse("2019-12-15").date(), parse("2020-03-15").date()
+        )
+    assert data == {
+        "ba1": {
+            parse("2019-12-15").date(): Decimal("0"),
+            parse("2020-01-15").date(): Decimal("100"),
+            parse("2020-02-15").date(): Decimal("200"),
+            parse("2020-03-15").date(): Decimal("0"),
+        },
+        "ba2": {
+            parse("2019-12-15").date(): Decimal("0"),
+            parse("2020-01-15").date(): Decimal("30"),
+            parse("2020-02-15").date(): Decimal("0"),
+            parse("2020-03-15").date(): Decimal("0"),
+        },
+    }
+
+    # the sum over all bank accounts is the same as without grouping
+    assert BankAccountEntry.objects.sum_balance_by_month(parse("2019-12-15").date(), parse("2020-03-15").date()) == {
+        month: data["ba1"][month] + data["ba2"][month] for month in data["ba1"]
+    }
@@ -1,7 +1,9 @@
 import pytest
 from decimal import Decimal
 from dateutil.parser import parse
+from dateutil.relativedelta import relativedelta
 from kitamanager.models import Child, ChildContract, ChildPaymentPlan, ChildPaymentTable, ChildPaymentTableEntry
+from kitamanager.templatetags.kitamanagertags import payment, requirement
 from kitamanager.tests.common import _childcontract_create
 
 
@@ -111,6 +113,77 @@ def test_childcontract_payment():
     assert cc4.payment(parse("2024-01-05").date()) == Decimal("322")
 
 
+@pytest.mark.django_db
+def test_childcontract_payment_requirement_num_queries(django_assert_num_queries):
+    """
+    The payment() and requirement() methods use the compiled ChildPaymentRates
+    and don't need any query once the rates are compiled
+    """
+    c = Child.objects.create(first_name="1", last_name="11", birth_date="2020-06-29")
+    cc = _childcontract_create(c, start="2021-07-01", end="2025-01-01", pay_tags=["ganztag"])
+    cc = ChildContract.objects.by_date(parse("2021-07-05").date()).get(pk=cc.pk)
+    # compile the rates
+    cc.payment(parse("2021-07-05").date())
+
+    with django_assert_num_queries(0):
+        for d in ["2021-07-05", "2022-06-01", "2024-01-05"]:
+            cc.payment(parse(d).date())
+            cc.requirement(parse(d).date())
+
+
+@pytest.mark.django_db
+def test_childcontract_payment_rates_invalidation(django_capture_on_commit_callbacks):
+    """
+    Changing a ChildPaymentTableEntry or ChildPaymentTable invalidates the compiled ChildPaymentRates
+    (when the change is committed)
+    """
+    c = Child.objects.create(first_name="1", last_name="11", birth_date="2020-06-29")
+    cc = _childcontract_create(c, start="2021-07-01", end="2025-01-01", pay_tags=["ganztag"])
+    cc.refresh_from_db()
+    assert cc.payment(parse("2021-07-05").date()) == Decimal("200")
+    assert cc.requirement(parse("2021-07-05").date()) == (Decimal("0.1"), Decimal("39.4"))
+
+    entry = ChildPaymentTableEntry.objects.get(table__start="2020-01-01", name="ganztag")
+    entry.pay = 250
+    entry.requirement = Decimal("0.2")
+    with django_capture_on_commit_callbacks(execute=True):
+        entry.save()
+    assert cc.payment(parse("2021-07-05").date()) == Decimal("250")
+    assert cc.requirement(parse("2021-07-05").date()) == (Decimal("0.2"), Decimal("39.4"))
+
+    table = entry.table
+    table.hours = 40
+    with django_capture_on_commit_callbacks(execute=True):
+        table.save()
+    assert cc.requirement(parse("2021-07-05").date()) == (Decimal("0.2"), Decimal("40"))
+
+    with django_capture_on_commit_callbacks(execute=True):
+        entry.delete()
+    assert cc.payment(parse("2021-07-05").date()) is None
+    assert cc.requirement(parse("2021-07-05").date()) is None
+
+    with django_capture_on_commit_callbacks(execute=True):
+        table.delete()
+    assert cc.payment(parse("2021-07-05").date()) is None
+
+
+@pytest.mark.django_db
+def test_childcontract_payment_overlapping_entries():
+    """
+    Overlapping age ranges for the same name all count (like in the SQL version)
+    """
+    c = Child.objects.create(first_name="1", last_name="11", birth_date="2020-06-29")
+    cc = _childcontract_create(c, start="2021-07-01", end="2025-01-01", pay_tags=["ganztag"])
+    cc.refresh_from_db()
+    table = ChildPaymentTable.objects.get(start="2020-01-01")
+    ChildPaymentTableEntry.objects.create(table=table, age_start=1, age_end=3, name="ganztag", pay=5, requirement=0.05)
+    d = parse("2021-07-05").date()
+    assert cc.payment(d) == Decimal("205")
+    assert cc.requirement(d) == (Decimal("0.15"), Decimal("39.4"))
+    assert ChildContract.objects.sum_payments(d) == Decimal("205")
+    assert ChildContract.objects.sum_requirements(d)[0] == Decimal("0.15")
+
+
 @pytest.mark.django_db
 def test_childcontract_requirement_outside_contract():
     """
@@ -183,6 +256,123 @@ def test_childcontract_sum_payment():
     assert ChildContract.objects.sum_payments(parse("2024-01-01").date()) == Decimal("322")
 
 
+@pytest.mark.django_db
+def test_childcontract_with_payment():
+    """
+    Test the with_payment() ChildContractQuerySet method against ChildContract.payment()
+    """
+    c1 = Child.objects.create(first_name="1", last_name="11", birth_date="2020-06-29")
+    c2 = Child.objects.create(first_name="2", last_name="22", birth_date="2018-02-01")
+    c3 = Child.objects.create(first_name="3", last_name="33", birth_date="2020-06-29")
+    _childcontract_create(c1, start="2021-07-01", end="2025-01-01", pay_tags=["ganztag"])
+    _childcontract_create(c2, start="2021-07-01", end="2025-01-01", pay_tags=["ganztag erweitert"])
+    _childcontract_create(c3, start="2021-07-01", end="2025-01-01", pay_tags=["does not exist"])
+
+    for d in ["2021-07-01", "2021-12-31", "2022-06-01", "2024-01-05"]:
+        date = parse(d).date()
+        contracts = ChildContract.objects.by_date(date).with_payment(date)
+        assert contracts.count() == 3
+        for cc in contracts:
+            assert cc.payment_sum == cc.payment(date)
+
+    # the "base" tag matches for every child
+    date = parse("2024-01-05").date()
+    assert dict(ChildContract.objects.by_date(date).with_payment(date).values_list("pk", "payment_sum")) == {
+        c1.contracts.get().pk: Decimal("322"),
+        c2.contracts.get().pk: Decimal("22"),
+        c3.contracts.get().pk: Decimal("22"),
+    }
+
+
+@pytest.mark.django_db
+def test_childcontract_payment_filter():
+    """
+    Test the "payment" template filter with and without a matching with_payment() annotation
+    """
+    c1 = Child.objects.create(first_name="1", last_name="11", birth_date="2020-06-29")
+    _childcontract_create(c1, start="2021-07-01", end="2025-01-01", pay_tags=["ganztag"])
+    date = parse("2021-07-01").date()
+    other_date = parse("2024-01-05").date()
+
+    cc = ChildContract.objects.with_payment(date).get()
+    assert cc.payment_date == date
+    assert payment(cc, date) == cc.payment_sum == Decimal("200")
+    # the annotation is for another date and not used
+    assert payment(cc, other_date) == cc.payment(other_date) == Decimal("322")
+    # without annotation
+    assert payment(ChildContract.objects.get(), other_date) == Decimal("322")
+
+
+@pytest.mark.django_db
+def test_childcontract_requirement_filter():
+    """
+    Test the "requirement" template filter with and without a matching with_requirement() annotation
+    """
+    c1 = Child.objects.create(first_name="1", last_name="11", birth_date="2020-06-29")
+    _childcontract_create(c1, start="2021-07-01", end="2025-01-01", pay_tags=["ganztag"])
+    date = parse("2021-07-01").date()
+    other_date = parse("2024-01-05").date()
+
+    cc = ChildContract.objects.with_requirement(date).get()
+    assert cc.requirement_date == date
+    assert requirement(cc, date) == (cc.requirement_sum, cc.requirement_hours) == cc.requirement(date)
+    # the annotation is for another date and not used
+    assert requirement(cc, other_date) == cc.requirement(other_date)
+    assert cc.requirement(other_date) != cc.requirement(date)
+    # without annotation
+    assert requirement(ChildContract.objects.get(), other_date) == cc.requirement(other_date)
+
+
+@pytest.mark.django_db
+def test_childcontract_sum_payment_num_queries(django_assert_num_queries):
+    """
+    The sum_payment() ChildContractManager method does not depend on the number of contracts
+    """
+    for i in range(10):
+        c = Child.objects.create(first_name=f"{i}", last_name=f"{i}", birth_date="2020-06-29")
+        _childcontract_create(c, start="2021-07-01", end="2025-01-01", pay_tags=["ganztag"])
+
+    with django_assert_num_queries(1):
+        assert ChildContract.objects.sum_payments(parse("2021-07-01").date()) == Decimal("2000")
+    date = parse("2021-07-01").date()
+    with django_assert_num_queries(1):
+        assert len(ChildContract.objects.by_date(date).with_payment(date).values_list("pk", "payment_sum")) == 10
+
+
+@pytest.mark.django_db
+def test_childcontract_priced_by_month(django_assert_max_num_queries):
+    """
+    Test the priced_by_month() ChildContractManager method against sum_payments() and sum_requirements()
+    """
+    # gets 3 during the range so the "ganztag" entry (age 0-2) doesn't match anymore
+    c1 = Child.objects.create(first_name="1", last_name="11", birth_date="2018-09-15")
+    _childcontract_create(c1, start="2020-03-01", end="2021-10-01", pay_tags=["ganztag"])
+    c2 = Child.objects.create(first_name="2", last_name="22", birth_date="2020-06-29")
+    _childcontract_create(c2, start="2021-07-01", end="2025-01-01", pay_tags=["ganztag erweitert"])
+    c3 = Child.objects.create(first_name="3", last_name="33", birth_date="2021-01-10")
+    _childcontract_create(c3, start="2021-02-01", end="2021-04-01", pay_tags=["ganztag"])
+    _childcontract_create(c3, start="2021-05-01", end="2024-03-01", pay_tags=["ganztag"])
+
+    from_dt = parse("2019-11-15").date()
+    to_dt = parse("2024-06-01").date()
+    months = []
+    while from_dt < to_dt:
+        months.append(from_dt)
+        from_dt += relativedelta(months=1)
+    with django_assert_max_num_queries(3):
+        priced = list(ChildContract.objects.priced_by_month(months))
+
+    assert len(priced) == 55
+    data = dict()
+    for date, contracts in priced:
+        data[date] = sum((payment for _area, payment, _requirement in contracts if payment), Decimal("0"))
+        assert data[date] == ChildContract.objects.sum_payments(date)
+        requirements = sum((requirement[0] for _area, _payment, requirement in contracts if requirement), Decimal("0"))
+        assert requirements == ChildContract.objects.sum_requirements(date)[0]
+    assert data[parse("2021-03-15").date()] == Decimal("400")
+    assert data[parse("2024-01-15").date()] == Decimal("344")
+
+
 @pytest.mark.django_db
 def test_childcontract_sum_requirements():
     """
@@ -210,6 +400,41 @@ def test_childcontract_sum_requirements():
     assert ChildContract.objects.sum_requirements(parse("2024-01-01").date()) == (Decimal("0.53"), Decimal("20.882"))
 
 
+@pytest.mark.django_db
+def test_childcontract_with_requirement():
+    """
+    Test the with_requirement() ChildContractQuerySet method against ChildContract.requirement()
+    """
+    c1 = Child.objects.create(first_name="1", last_name="11", birth_date="2020-06-29")
+    c2 = Child.objects.create(first_name="2", last_name="22", birth_date="2018-02-01")
+    c3 = Child.objects.create(first_name="3", last_name="33", birth_date="2020-06-29")
+    _childcontract_create(c1, start="2021-07-01", end="2025-01-01", pay_tags=["ganztag"])
+    _childcontract_create(c2, start="2021-07-01", end="2025-01-01", pay_tags=["ganztag erweitert"])
+    _childcontract_create(c3, start="2021-07-01", end="2025-01-01", pay_tags=["does not exist"])
+
+    for d in ["2021-07-01", "2021-12-31", "2022-06-01", "2024-01-05"]:
+        date = parse(d).date()
+        for cc in ChildContract.objects.by_date(date).with_requirement(date):
+            expected = cc.requirement(date)
+            if expected is None:
+                assert not cc.requirement_sum or cc.requirement_hours is None
+            else:
+                assert (cc.requirement_sum, cc.requirement_hours) == expected
+
+
+@pytest.mark.django_db
+def test_childcontract_sum_requirements_num_queries(django_assert_num_queries):
+    """
+    The sum_requirements() ChildContractManager method does not depend on the number of contracts
+    """
+    for i in range(10):
+        c = Child.objects.create(first_name=f"{i}", last_name=f"{i}", birth_date="2020-06-29")
+        _childcontract_create(c, start="2021-07-01", end="2025-01-01", pay_tags=["ganztag"])
+
+    with django_assert_num_queries(1):
+        assert ChildContract.objects.sum_requirements(parse("2021-07-01").date()) == (Decimal("1"), Decimal("39.4"))
+
+
 @pytest.mark.django_db
 def test_childcontract_sum_requirements_multiple_paymentplans():
     """
@@ -240,40 +465,3 @@ def test_childcontract_sum_requirements_multiple_paymentplans():
 
     # with both child contracts
     assert ChildContract.objects.sum_requirements(parse("2021-07-01").date()) == (Decimal("0.3"), Decimal("9"))
-
-
-@pytest.mark.django_db
-def test_childcontract_count_by_month():
-    """
-    Test the ChildContractManager count_by_month() method
-    """
-    # without any data
-    assert ChildContract.objects.count_by_month(parse("2020-01-01").date(), parse("2021-01-01").date()) == {
-        2020: [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-    }
-
-    # create some data
-    c1 = Child.objects.create(first_name="1", last_name="11", birth_date="2020-06-29")
-    _childcontract_create(c1, start="2021-07-01", end="2021-08-01", pay_tags=["ganztag"])
-    _childcontract_create(c1, start="2023-07-01", end="2024-01-01", pay_tags=["ganztag erweitert"])
-
-    c2 = Child.objects.create(first_name="2", last_name="22", birth_date="2020-06-29")
-    _childcontract_create(c2, start="2022-07-01", end="2024-06-01", pay_tags=["ganztag"])
-
-    # check still outside of the created data
-    assert ChildContract.objects.count_by_month(parse("2020-01-01").date(), parse("2021-01-01").date()) == {
-        2020: [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-    }
-
-    # now check within the created data
-    assert ChildContract.objects.count_by_month(parse("2021-01-01").date(), parse("2022-06-01").date()) == {
-        2021: [0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0],
-        2022: [0, 0, 0, 0, 0],
-    }
-
-    # now check within the created data with both children
-    assert ChildContract.objects.count_by_month(parse("2022-06-01").date(), parse("2024-08-01").date()) == {
-        2022: [0, 1, 1, 1, 1, 1, 1],
-        2023: [1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2],
-        2024: [1, 1, 1, 1, 1, 0, 0],
-    }
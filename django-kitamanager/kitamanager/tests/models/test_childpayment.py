@@ -1,7 +1,13 @@
+import datetime
 import pytest
+import threading
+from decimal import Decimal
+from django.db import connection, transaction
 from django.db.utils import IntegrityError
 
 from kitamanager.models import ChildPaymentPlan, ChildPaymentTable, ChildPaymentTableEntry
+from kitamanager.models.child_payment import ChildPaymentRates
+from kitamanager.tests.common import _childpaymentplan_create
 
 
 @pytest.mark.django_db
@@ -136,3 +142,29 @@ def test_childpaymenttableentry_create():
         ChildPaymentTableEntry.objects.create(
             table=t11, age_start=0, age_end=1, name="ganztag_erweitert", pay=200, requirement=0.2
         )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_childpaymentrates_invalidation_after_commit():
+    """
+    Rates compiled by another thread while a change is not committed yet are not used after the commit
+    """
+    plan = _childpaymentplan_create()
+    date = datetime.date(2021, 7, 1)
+    assert ChildPaymentRates.for_plan(plan.pk).payment(date, 1, ["ganztag"]) == Decimal("200")
+
+    def _for_plan():
+        try:
+            ChildPaymentRates.for_plan(plan.pk)
+        finally:
+            connection.close()
+
+    with transaction.atomic():
+        entry = ChildPaymentTableEntry.objects.get(table__start=datetime.date(2020, 1, 1), name="ganztag")
+        entry.pay = 1200
+        entry.save()
+        # another request (with its own database connection) only sees the committed data
+        thread = threading.Thread(target=_for_plan)
+        thread.start()
+        thread.join()
+    assert ChildPaymentRates.for_plan(plan.pk).payment(date, 1, ["ganztag"]) == Decimal("1200")
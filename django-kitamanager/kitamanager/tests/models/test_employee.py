@@ -4,7 +4,13 @@ import math
 from django.db.utils import IntegrityError
 from dateutil.parser import parse
 
-from kitamanager.models import Employee, EmployeePaymentPlan, EmployeePaymentTable, EmployeePaymentTableEntry
+from kitamanager.models import (
+    Employee,
+    EmployeeContract,
+    EmployeePaymentPlan,
+    EmployeePaymentTable,
+    EmployeePaymentTableEntry,
+)
 from kitamanager.tests.common import _employeecontract_create
 
 
@@ -112,3 +118,32 @@ def test_employee_pay_level_next():
     # and also None if the latest pay level got already reached
     _employeecontract_create(e, start="2020-01-01", end="2021-01-01", pay_level=6)
     assert e.pay_level_next(parse("2020-01-01").date()) is None
+
+
+@pytest.mark.django_db
+def test_employee_hours_by_month(django_assert_num_queries):
+    """
+    Check Employee instance hours_by_month() and the EmployeeContractManager hours_by_month()
+    """
+    e1 = Employee.objects.create(first_name="1", last_name="11", birth_date="1980-10-22")
+    e2 = Employee.objects.create(first_name="2", last_name="22", birth_date="1980-10-22")
+    # no contract at all
+    assert e1.hours_by_month(2020) == [{"hours": Decimal("0"), "hours_fulltime": Decimal("0")}] * 12
+
+    plan = EmployeePaymentPlan.objects.create(name="plan100")
+    EmployeePaymentTable.objects.create(plan=plan, hours=39, start="2020-01-01", end="2020-07-01")
+    EmployeePaymentTable.objects.create(plan=plan, hours=40, start="2020-07-01", end="2020-12-01")
+    _employeecontract_create(e1, start="2019-01-01", end="2020-03-01", pay_plan=plan, hours_child=30, hours_team=2)
+    _employeecontract_create(e1, start="2020-05-01", end="2021-01-01", pay_plan=plan, hours_child=20, hours_team=2)
+    _employeecontract_create(e2, start="2020-06-15", end="2021-01-01", pay_plan=plan, hours_child=10, hours_team=0)
+
+    with django_assert_num_queries(1):
+        data = EmployeeContract.objects.hours_by_month(2020)
+    assert data[e1.pk] == e1.hours_by_month(2020)
+    assert data[e2.pk] == e2.hours_by_month(2020)
+    assert [x["hours"] for x in data[e1.pk]] == [32, 32, 0, 0] + [22] * 8
+    assert [x["hours_fulltime"] for x in data[e1.pk]] == [39, 39, 0, 0, 39, 39] + [40] * 5 + [0]
+    assert [x["hours"] for x in data[e2.pk]] == [0] * 6 + [10] * 6
+
+    # only for the given employees
+    assert list(EmployeeContract.objects.hours_by_month(2020, persons=[e2]).keys()) == [e2.pk]
@@ -1,4 +1,5 @@
 import pytest
+import math
 from django.db.utils import IntegrityError
 from decimal import Decimal
 from dateutil.parser import parse
@@ -277,6 +278,63 @@ def test_employeecontract_sum_hours_group_by_area():
     assert list(res) == [{"area": "area2", "hours_sum": Decimal("4.00")}]
 
 
+@pytest.mark.django_db
+def test_employeecontract_with_salary(django_assert_num_queries):
+    """
+    Test the EmployeeContractQuerySet with_salary() method against the Employee methods
+    """
+    e1 = Employee.objects.create(first_name="1", last_name="11", birth_date="1980-10-22")
+    _employeecontract_create(e1, start="2016-05-01", end="2018-03-01", pay_level=1)
+    _employeecontract_create(e1, start="2018-03-01", end="2021-01-01", pay_level=1, hours_child=20)
+    e2 = Employee.objects.create(first_name="2", last_name="22", birth_date="1980-10-22")
+    _employeecontract_create(e2, start="2019-02-01", end="2021-01-01", pay_level=2)
+    e3 = Employee.objects.create(first_name="3", last_name="33", birth_date="1980-10-22")
+    _employeecontract_create(e3, start="2019-02-01", end="2021-01-01", pay_level=6)
+    # no matching EmployeePaymentTableEntry
+    e4 = Employee.objects.create(first_name="4", last_name="44", birth_date="1980-10-22")
+    _employeecontract_create(e4, start="2019-02-01", end="2021-01-01", pay_group=2)
+
+    for d in ["2019-06-01", "2020-06-01"]:
+        date = parse(d).date()
+        with django_assert_num_queries(1):
+            contracts = list(EmployeeContract.objects.by_date(date).with_salary(date))
+        assert len(contracts) == 4
+        for c in contracts:
+            assert c.salary == c.person.salary(date)
+            assert c.begin_date == c.person.begin_date
+            assert c.pay_level_next == c.person.pay_level_next(date)
+            if c.salary is not None:
+                assert c.table_hours == Decimal("39")
+
+    date = parse("2020-06-01").date()
+    contracts = {c.person: c for c in EmployeeContract.objects.by_date(date).with_salary(date)}
+    assert math.isclose(contracts[e1].salary, Decimal(100 * 22.0 / 39.0))
+    assert contracts[e1].pay_level_next == parse("2017-05-01").date()
+    assert contracts[e2].salary == Decimal("200")
+    assert contracts[e2].pay_level_next == parse("2022-02-01").date()
+    assert contracts[e3].salary is None
+    assert contracts[e3].pay_level_next is None
+    assert contracts[e4].salary is None
+
+
+@pytest.mark.django_db
+def test_employeecontract_sum_salaries(django_assert_num_queries):
+    """
+    Test the EmployeeContractManager sum_salaries() method
+    """
+    # without any contract
+    assert EmployeeContract.objects.sum_salaries(parse("2020-06-01").date()) == 0
+
+    for i in range(10):
+        e = Employee.objects.create(first_name=f"{i}", last_name=f"{i}", birth_date="1980-10-22")
+        _employeecontract_create(e, start="2019-02-01", end="2021-01-01", pay_level=1 + i % 2)
+
+    with django_assert_num_queries(1):
+        assert EmployeeContract.objects.sum_salaries(parse("2020-06-01").date()) == Decimal("1500")
+    # no EmployeePaymentTable for that date
+    assert EmployeeContract.objects.sum_salaries(parse("2019-06-01").date()) == 0
+
+
 @pytest.mark.django_db
 def test_employeecontract_get_latest_by():
     """
@@ -0,0 +1,212 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import datetime
+from decimal import Decimal
+from dateutil.relativedelta import relativedelta
+from kitamanager.models import Area, Child, ChildContract, Employee, MonthlyFact
+from kitamanager.tests.common import _childcontract_create, _employeecontract_create
+
+
+def _setup():
+    """
+    A child and an employee with contracts in 2020 (two different areas)
+    """
+    area2 = Area.objects.create(name="area2", educational=True)
+    child = Child.objects.create(first_name="c1", last_name="c1", birth_date="2019-10-22")
+    _childcontract_create(child, start="2020-03-01", end="2020-06-01")
+    employee = Employee.objects.create(first_name="e1", last_name="e1", birth_date="1990-01-01")
+    _employeecontract_create(employee, area=area2, start="2020-02-01", end="2020-04-01")
+    return child, employee
+
+
+@pytest.mark.django_db
+def test_monthly_fact_by_month():
+    """
+    Check MonthlyFactManager.by_month() against the values computed by the other managers
+    """
+    _setup()
+    facts = MonthlyFact.objects.by_month(datetime.date(2020, 1, 1), datetime.date(2020, 7, 1))
+    assert list(facts.keys()) == [datetime.date(2020, m, 1) for m in range(1, 7)]
+    assert [f.children for f in facts.values()] == [0, 0, 1, 1, 1, 0]
+    assert [f.employees for f in facts.values()] == [0, 1, 1, 0, 0, 0]
+    for month, fact in facts.items():
+        assert fact.payments == ChildContract.objects.sum_payments(month)
+        requirements, requirements_hours = ChildContract.objects.sum_requirements(month)
+        assert fact.requirements == requirements
+        assert fact.requirements_hours == requirements_hours
+    march = facts[datetime.date(2020, 3, 1)]
+    assert march.payments == Decimal("200")
+    assert march.requirements == Decimal("0.1")
+    assert march.employee_hours_child == Decimal("37")
+    assert march.employee_hours_team == Decimal("2")
+    assert march.salaries == Decimal("100")
+    # all months stored (one row for all areas and one for each area with values)
+    assert MonthlyFact.objects.filter(area__isnull=True).count() == 6
+    assert MonthlyFact.objects.filter(area="area1").count() == 3
+    assert MonthlyFact.objects.filter(area="area2").count() == 2
+
+
+@pytest.mark.django_db
+def test_monthly_fact_by_month_stored(django_assert_num_queries):
+    """
+    Check that stored facts are not computed again
+    """
+    _setup()
+    MonthlyFact.objects.by_month(datetime.date(2020, 1, 1), datetime.date(2020, 7, 1))
+    with django_assert_num_queries(2):
+        facts = MonthlyFact.objects.by_month(datetime.date(2020, 1, 1), datetime.date(2020, 7, 1))
+    assert facts[datetime.date(2020, 3, 1)].children == 1
+
+
+@pytest.mark.django_db
+def test_monthly_fact_by_month_group_by_area():
+    """
+    Check MonthlyFactManager.by_month_group_by_area()
+    """
+    _setup()
+    data = MonthlyFact.objects.by_month_group_by_area(datetime.date(2020, 1, 1), datetime.date(2020, 7, 1))
+    assert list(data.keys()) == ["area1", "area2"]
+    assert [f.children for f in data["area1"].values()] == [0, 0, 1, 1, 1, 0]
+    assert [f.employees for f in data["area2"].values()] == [0, 1, 1, 0, 0, 0]
+
+
+@pytest.mark.django_db
+def test_monthly_fact_staffing_series(django_assert_num_queries, django_capture_on_commit_callbacks):
+    """
+    Check MonthlyFactManager.staffing_series() and that it is computed once until data changes
+    """
+    child, _ = _setup()
+    facts = MonthlyFact.objects.by_month(datetime.date(2020, 1, 1), datetime.date(2020, 7, 1))
+    series = MonthlyFact.objects.staffing_series(datetime.date(2020, 1, 1), datetime.date(2020, 7, 1))
+    assert [s.month for s in series] == list(facts.keys())
+    assert [s.requirements_hours for s in series] == [f.requirements_hours for f in facts.values()]
+    march = series[2]
+    assert march.employee_hours == (
+        facts[march.month].employee_hours_child
+        + facts[march.month].employee_hours_team
+        + facts[march.month].employee_hours_management
+    )
+    assert march.percent == march.employee_hours / march.requirements_hours * 100 - 100
+    # no requirements
+    assert series[1].percent == Decimal("0")
+    # memoized
+    with django_assert_num_queries(0):
+        assert MonthlyFact.objects.staffing_series(datetime.date(2020, 1, 1), datetime.date(2020, 7, 1)) == series
+    # changed (and committed) data
+    with django_capture_on_commit_callbacks(execute=True):
+        _childcontract_create(child, start="2020-01-01", end="2020-02-01")
+    series = MonthlyFact.objects.staffing_series(datetime.date(2020, 1, 1), datetime.date(2020, 7, 1))
+    assert series[0].requirements_hours > 0
+
+
+@pytest.mark.django_db
+def test_monthly_fact_invalidate_on_change(django_capture_on_commit_callbacks):
+    """
+    Check that changed contracts, children and payment tables invalidate the stored facts
+    """
+    child, employee = _setup()
+    from_dt, to_dt = datetime.date(2020, 1, 1), datetime.date(2021, 1, 1)
+    MonthlyFact.objects.by_month(from_dt, to_dt)
+    assert MonthlyFact.objects.filter(area__isnull=True).count() == 12
+
+    # the old and the new range of a changed contract
+    contract = child.contracts.get()
+    contract.start = datetime.date(2020, 8, 1)
+    contract.end = datetime.date(2020, 10, 1)
+    contract.save()
+    assert sorted(MonthlyFact.objects.filter(area__isnull=True).values_list("month", flat=True)) == [
+        datetime.date(2020, m, 1) for m in [1, 2, 6, 7, 10, 11, 12]
+    ]
+    facts = MonthlyFact.objects.by_month(from_dt, to_dt)
+    assert [f.children for f in facts.values()] == [0, 0, 0, 0, 0, 0, 0, 1, 1, 0, 0, 0]
+
+    # a child with a new birth date
+    child.birth_date = datetime.date(2017, 1, 1)
+    child.save()
+    assert MonthlyFact.objects.filter(area__isnull=True).count() == 10
+    facts = MonthlyFact.objects.by_month(from_dt, to_dt)
+    assert facts[datetime.date(2020, 8, 1)].payments == Decimal("0")
+
+    # a deleted employee contract
+    employee.contracts.get().delete()
+    assert MonthlyFact.objects.filter(area__isnull=True).count() == 10
+    facts = MonthlyFact.objects.by_month(from_dt, to_dt)
+    assert [f.employees for f in facts.values()] == [0] * 12
+
+    # a changed payment table entry
+    entry = contract.pay_plan.tables.get(start="2020-01-01").entries.get(name="ganztag")
+    entry.age_end = 5
+    with django_capture_on_commit_callbacks(execute=True):
+        entry.save()
+    assert MonthlyFact.objects.filter(area__isnull=True).count() == 0
+    facts = MonthlyFact.objects.by_month(from_dt, to_dt)
+    assert facts[datetime.date(2020, 8, 1)].payments == Decimal("200")
+
+
+@pytest.mark.django_db
+def test_monthly_fact_invalidate_on_table_change(django_capture_on_commit_callbacks):
+    """
+    Check that the previous range of a changed payment table (and of the previous table of a
+    moved entry) is invalidated, too
+    """
+    child = Child.objects.create(first_name="c1", last_name="c1", birth_date="2020-06-01")
+    contract = _childcontract_create(child, start="2021-01-01", end="2022-01-01")
+    june = datetime.date(2021, 6, 1)
+    facts = MonthlyFact.objects.by_month(datetime.date(2021, 1, 1), datetime.date(2022, 1, 1))
+    assert facts[june].payments == Decimal("200")
+
+    # shrink the table
+    table = contract.pay_plan.tables.get(start="2020-01-01")
+    table.end = datetime.date(2021, 1, 1)
+    with django_capture_on_commit_callbacks(execute=True):
+        table.save()
+    facts = MonthlyFact.objects.by_month(datetime.date(2021, 1, 1), datetime.date(2022, 1, 1))
+    assert ChildContract.objects.sum_payments(june) == Decimal("0")
+    assert facts[june].payments == Decimal("0")
+
+    # move an entry from a table to another table (with a different range)
+    table.end = datetime.date(2022, 1, 1)
+    with django_capture_on_commit_callbacks(execute=True):
+        table.save()
+    assert MonthlyFact.objects.by_month(june, june + relativedelta(months=1))[june].payments == Decimal("200")
+    other = contract.pay_plan.tables.get(start="2024-01-01")
+    entry = table.entries.get(name="ganztag")
+    entry.table = other
+    with django_capture_on_commit_callbacks(execute=True):
+        entry.save()
+    assert ChildContract.objects.sum_payments(june) == Decimal("0")
+    assert MonthlyFact.objects.by_month(june, june + relativedelta(months=1))[june].payments == Decimal("0")
+
+
+@pytest.mark.django_db
+def test_monthly_fact_deferred_invalidation(django_assert_num_queries):
+    """
+    Check that invalidations are collected and done once at the end
+    """
+    MonthlyFact.objects.by_month(datetime.date(2020, 1, 1), datetime.date(2021, 1, 1))
+    with MonthlyFact.objects.deferred_invalidation():
+        with django_assert_num_queries(0):
+            MonthlyFact.objects.invalidate(datetime.date(2020, 2, 1), datetime.date(2020, 3, 1))
+            MonthlyFact.objects.invalidate(datetime.date(2020, 5, 1), datetime.date(2020, 7, 1))
+        assert MonthlyFact.objects.count() == 12
+    assert sorted(MonthlyFact.objects.values_list("month", flat=True)) == [
+        datetime.date(2020, m, 1) for m in [1, 7, 8, 9, 10, 11, 12]
+    ]
+
+
+@pytest.mark.django_db
+def test_monthly_fact_update_locked():
+    """
+    Computing and invalidating the facts take the same lock (before computing resp. deleting)
+    """
+    _setup()
+    with CaptureQueriesContext(connection) as ctx:
+        MonthlyFact.objects.update([datetime.date(2020, 3, 1)])
+    sqls = [q["sql"] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+    assert sqls[0].startswith("SELECT pg_advisory_xact_lock")
+    with CaptureQueriesContext(connection) as ctx:
+        MonthlyFact.objects.invalidate(datetime.date(2020, 1, 1), datetime.date(2021, 1, 1))
+    sqls = [q["sql"] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+    assert sqls[0].startswith("SELECT pg_advisory_xact_lock")
+    assert sqls[-1].startswith("DELETE")
@@ -0,0 +1,34 @@
+import pytest
+import datetime
+from decimal import Decimal
+from kitamanager.models import RevenueName, RevenueEntry
+
+
+@pytest.mark.django_db
+def test_revenueentry_pay_by_month(django_assert_num_queries):
+    """
+    Test RevenueEntryManager pay_by_month()
+    """
+    rn1 = RevenueName.objects.create(name="rn1")
+    rn2 = RevenueName.objects.create(name="rn2")
+    RevenueEntry.objects.create(name=rn1, start="2020-01-01", end="2020-02-01", pay="100")
+    # an entry spanning several months
+    RevenueEntry.objects.create(name=rn1, start="2020-03-01", end="2020-06-01", pay="300")
+    RevenueEntry.objects.create(name=rn2, start="2020-01-01", end="2021-01-01", pay="5")
+
+    with django_assert_num_queries(1):
+        pay = RevenueEntry.objects.pay_by_month("rn1", datetime.date(2019, 12, 1), datetime.date(2020, 7, 1))
+    assert pay == {
+        datetime.date(2019, 12, 1): None,
+        datetime.date(2020, 1, 1): Decimal("100"),
+        datetime.date(2020, 2, 1): None,
+        datetime.date(2020, 3, 1): Decimal("300"),
+        datetime.date(2020, 4, 1): Decimal("300"),
+        datetime.date(2020, 5, 1): Decimal("300"),
+        datetime.date(2020, 6, 1): None,
+    }
+    # the same as by_date() for each month
+    for month, value in pay.items():
+        entry = RevenueEntry.objects.by_date(month).filter(name="rn1").first()
+        assert value == (entry.pay if entry else None)
+    assert RevenueEntry.objects.pay_by_month("rn1", datetime.date(2020, 1, 1), datetime.date(2020, 1, 1)) == {}
@@ -64,6 +64,31 @@ def test_bankaccount_import_do_fileupload(client):
     assert BankAccount.objects.get(name="Bank für Sozialwirt. Tagesgeld").entries.first().balance == Decimal("20000.00")
 
 
+@pytest.mark.django_db
+def test_bankaccount_import_parse_once(client, monkeypatch):
+    """
+    The upload is parsed once (by the form validator) and not again when uploading the same file
+    """
+    from kitamanager import bankimport
+
+    loaded = []
+    bankimport_load_workbook = bankimport.load_workbook
+
+    def load_workbook(*args, **kwargs):
+        loaded.append(kwargs["filename"])
+        return bankimport_load_workbook(*args, **kwargs)
+
+    monkeypatch.setattr(bankimport, "load_workbook", load_workbook)
+    f = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "Kontostände 01.11.2023.xlsx")
+    for _ in range(2):
+        with open(f, "rb") as fp:
+            response = client.post(reverse("admin:bankaccountentry-import"), {"file_xls": fp})
+        assert response.status_code == 302
+    assert len(loaded) == 1
+    assert BankAccount.objects.count() == 5
+    assert BankAccountEntry.objects.count() == 5
+
+
 @pytest.mark.django_db
 def test_bankaccount_charts_sum_balance_by_month_no_data(admin_client):
     # without any data
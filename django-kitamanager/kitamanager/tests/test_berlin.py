@@ -1,5 +1,11 @@
+import pytest
 import os
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.urls import reverse
 from kitamanager import berlin
+from kitamanager.models import RevenueEntry
 import datetime
 
 
@@ -51,3 +57,69 @@ def test_berlin_invoice_children_gte_2025_07():
     assert bi.children["GB-127"]["pay_tags"] == ["ganztag", "qm/mss"]
     assert bi.children["GB-132"]["pay_tags"] == ["ganztag", "ndh", "qm/mss"]
     assert bi.children["GB-150"]["pay_tags"] == ["teilzeit"]
+
+
+@pytest.mark.parametrize("read_only", [True, False])
+def test_berlin_invoice_read_only(read_only):
+    """
+    test the streaming (read-only) and the full workbook mode
+    """
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    with berlin.BerlinInvoice(
+        os.path.join(dir_path, "fixtures/berlin/e_Abrechnung_09-22_0770.xlsx"), read_only=read_only
+    ) as bi:
+        assert bi.wb.read_only is read_only
+        assert bi.pay == 1500.50
+        assert bi.date == datetime.date(2022, 9, 1)
+        # the children are parsed once
+        assert bi.children is bi.children
+        assert len(bi.children) == 51
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+@pytest.mark.django_db
+def test_revenue_berlin_import(jobs):
+    dir_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures/berlin")
+    out = StringIO()
+    call_command("revenue_berlin_import", dir_path, "--jobs", jobs, stdout=out)
+    assert out.getvalue().splitlines()[-1] == f"Done: 2 files read with {jobs} jobs, 2 created, 0 updated"
+    assert list(RevenueEntry.objects.values_list("start", "end", "pay", "comment")) == [
+        (
+            datetime.date(2025, 11, 1),
+            datetime.date(2025, 12, 1),
+            Decimal("1500.50"),
+            "Imported from Abrechnung_11-25_0770.xlsx",
+        ),
+        (
+            datetime.date(2022, 9, 1),
+            datetime.date(2022, 10, 1),
+            Decimal("1500.50"),
+            "Imported from e_Abrechnung_09-22_0770.xlsx",
+        ),
+    ]
+    # a second import does not change anything
+    out = StringIO()
+    call_command("revenue_berlin_import", dir_path, "--jobs", jobs, stdout=out)
+    assert out.getvalue().splitlines() == [f"Done: 2 files read with {jobs} jobs, 0 created, 0 updated"]
+
+
+@pytest.mark.django_db
+def test_revenue_berlin_import_upload(admin_client, monkeypatch):
+    """
+    The uploaded invoice is parsed once (by the form validator) and reused by the view
+    """
+    loaded = []
+    berlin_load_workbook = berlin.load_workbook
+
+    def load_workbook(*args, **kwargs):
+        loaded.append(kwargs["filename"])
+        return berlin_load_workbook(*args, **kwargs)
+
+    monkeypatch.setattr(berlin, "load_workbook", load_workbook)
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    for _ in range(2):
+        with open(os.path.join(dir_path, "fixtures/berlin/e_Abrechnung_09-22_0770.xlsx"), "rb") as fp:
+            response = admin_client.post(reverse("admin:revenueentry-berlin-import"), {"file_xls": fp})
+        assert response.status_code == 302
+    assert len(loaded) == 1
+    assert list(RevenueEntry.objects.values_list("start", "pay")) == [(datetime.date(2022, 9, 1), Decimal("1500.50"))]
@@ -0,0 +1,99 @@
+import pytest
+import datetime
+from io import StringIO
+from django.core.management import call_command
+from kitamanager.cache import DATA_VERSION, version_get
+from kitamanager.models import Area, Child, ChildContract, ChildPaymentPlan, MonthlyFact
+
+CHILD_FILE = """
+kinder:
+  - first_name: c1
+    last_name: c1
+    birth_date: 2019-10-22
+    voucher: v1
+    contracts:
+      - begin: 2020-01-01
+        end: 2021-01-01
+        area: area1
+        integration_a: false
+        integration_b: false
+        qm: true
+        ndh: false
+        care_period: gt
+      - begin: 2021-01-01
+        end: 2022-01-01
+        area: Sonstiges
+        integration_a: false
+        integration_b: false
+        qm: false
+        ndh: false
+        care_period: tz
+  - first_name: c2
+    last_name: c2
+    birth_date: "2018-05-01"
+    voucher: v2
+    contracts:
+      - begin: "2020-06-01"
+        end: "2020-07-01"
+        area: area1
+        integration_a: true
+        integration_b: false
+        qm: false
+        ndh: false
+        care_period: ht
+"""
+
+
+def _child_import(tmp_path, content, *args):
+    child_file = tmp_path / "children.yaml"
+    child_file.write_text(content)
+    out = StringIO()
+    call_command("child_import", "plan1", str(child_file), *args, stdout=out)
+    return out.getvalue()
+
+
+@pytest.mark.django_db
+def test_child_import(tmp_path, django_assert_max_num_queries, django_capture_on_commit_callbacks):
+    ChildPaymentPlan.objects.create(name="plan1")
+    with django_assert_max_num_queries(15):
+        out = _child_import(tmp_path, CHILD_FILE)
+    assert out.strip() == "Done: areas: 2 created, children: 2 created, 0 updated, contracts: 3 created, 0 updated"
+    assert Area.objects.get(name="Sonstiges").educational is False
+    assert Area.objects.get(name="area1").educational is True
+    c1 = Child.objects.get(first_name="c1")
+    assert list(c1.contracts.values_list("start", "pay_tags")) == [
+        (datetime.date(2020, 1, 1), ["qm/mss", "ganztag"]),
+        (datetime.date(2021, 1, 1), ["teilzeit"]),
+    ]
+    assert ChildContract.objects.get(person__first_name="c2").pay_tags == ["integration a", "halbtag"]
+
+    # a second import updates the changed rows only
+    MonthlyFact.objects.by_month(datetime.date(2020, 1, 1), datetime.date(2020, 9, 1))
+    version = version_get(DATA_VERSION)
+    with django_capture_on_commit_callbacks(execute=True):
+        out = _child_import(
+            tmp_path, CHILD_FILE.replace("voucher: v2", "voucher: v3").replace("care_period: ht", "care_period: tz")
+        )
+    # bulk queries do not send signals, the import bumps the version (after the commit)
+    assert version_get(DATA_VERSION) != version
+    assert out.strip() == "Done: areas: 0 created, children: 0 created, 1 updated, contracts: 0 created, 1 updated"
+    assert Child.objects.get(first_name="c2").voucher == "v3"
+    assert ChildContract.objects.get(person__first_name="c2").pay_tags == ["integration a", "teilzeit"]
+    assert ChildContract.objects.count() == 3
+    # the facts for the changed range are invalidated
+    assert list(MonthlyFact.objects.filter(area__isnull=True).values_list("month", flat=True)) == [
+        datetime.date(2020, m, 1) for m in [1, 2, 3, 4, 5, 7, 8]
+    ]
+
+
+@pytest.mark.django_db
+def test_child_import_dry_run(tmp_path, django_capture_on_commit_callbacks):
+    ChildPaymentPlan.objects.create(name="plan1")
+    version = version_get(DATA_VERSION)
+    with django_capture_on_commit_callbacks(execute=True):
+        out = _child_import(tmp_path, CHILD_FILE, "--dry-run", "--batch-size", "1")
+    assert version_get(DATA_VERSION) == version
+    assert out.strip() == "Dry run: areas: 2 created, children: 2 created, 0 updated, contracts: 3 created, 0 updated"
+    assert Area.objects.count() == 0
+    assert Child.objects.count() == 0
+    assert ChildContract.objects.count() == 0
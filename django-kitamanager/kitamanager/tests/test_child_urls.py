@@ -1,7 +1,10 @@
 import pytest
 import datetime
+from decimal import Decimal
 from django.urls import reverse
-from kitamanager.models import Child, ChildPaymentPlan, ChildPaymentTable, ChildPaymentTableEntry
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from kitamanager.models import Child, ChildPaymentPlan, ChildPaymentTable, ChildPaymentTableEntry, MonthlyFact
 from kitamanager.tests.common import _childcontract_create, _childpaymentplan_create
 
 
@@ -20,11 +23,39 @@ def test_child_list_csv(admin_client):
     assert response.headers["Content-Type"] == "text/csv"
     assert response.headers["Content-Disposition"] == f'attachment; filename="child-list-{historydate}.csv"'
     assert (
-        response.content.decode()
+        response.getvalue().decode()
         == "ID,First Name,Last Name,Age,Voucher,Area,Pay tags,Requirement (full time person),Payment (Euro)\r\n"
     )
 
 
+@pytest.mark.django_db
+def test_child_list_csv_with_data(admin_client, django_assert_num_queries):
+    c1 = Child.objects.create(first_name="1", last_name="11", birth_date="2019-10-22", voucher="v1")
+    _childcontract_create(c1, start="2020-01-01", end="2021-01-01")
+    # all values are computed by a single query
+    with django_assert_num_queries(3):
+        response = admin_client.get(reverse("kitamanager:child-list-csv") + "?historydate=2020-06-01")
+        content = response.getvalue().decode()
+    assert response.status_code == 200
+    assert response.streaming
+    assert content.splitlines()[1] == f"{c1.pk},1,11,0,v1,area1 (educational: True),['ganztag'],0.100,200.00"
+
+
+@pytest.mark.django_db
+def test_child_list_csv_months(admin_client):
+    c1 = Child.objects.create(first_name="1", last_name="11", birth_date="2019-10-22", voucher="v1")
+    _childcontract_create(c1, start="2020-03-01", end="2020-05-01")
+    response = admin_client.get(reverse("kitamanager:child-list-csv-months") + "?start=2020-01-01&end=2020-12-31")
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"] == 'attachment; filename="child-list-2020-01-01-2020-12-31.csv"'
+    lines = response.getvalue().decode().splitlines()
+    assert lines[0].startswith("Month,ID,First Name")
+    assert lines[1:] == [
+        f"2020-03-01,{c1.pk},1,11,0,v1,area1 (educational: True),['ganztag'],0.100,200.00",
+        f"2020-04-01,{c1.pk},1,11,0,v1,area1 (educational: True),['ganztag'],0.100,200.00",
+    ]
+
+
 @pytest.mark.django_db
 def test_child_list_with_child_no_contract(admin_client):
     Child.objects.create(first_name="1", last_name="11", birth_date="2017-10-22")
@@ -42,10 +73,34 @@ def test_child_list_with_child_with_contract(admin_client):
     assert response.context["object_list"].count() == 0
     response = admin_client.get(reverse("kitamanager:child-list") + "?historydate=2020-06-01")
     assert response.context["object_list"].count() == 1
+    assert response.context["object_list"][0].payment_sum == Decimal("200")
+    assert response.context["sum_payments"] == Decimal("200")
     # now query with correct historydate
     assert response.status_code == 200
 
 
+@pytest.mark.django_db
+def test_child_list_num_queries(admin_client, django_assert_max_num_queries):
+    """
+    The number of queries for the child list does not depend on the number of children
+    """
+    _childpaymentplan_create()
+    for i in range(3):
+        c = Child.objects.create(first_name=f"{i}", last_name=f"{i}", birth_date="2017-10-22")
+        _childcontract_create(c, start="2018-01-01", end="2022-01-01")
+    with CaptureQueriesContext(connection) as ctx:
+        response = admin_client.get(reverse("kitamanager:child-list") + "?historydate=2020-06-01")
+    assert response.status_code == 200
+
+    for i in range(3, 30):
+        c = Child.objects.create(first_name=f"{i}", last_name=f"{i}", birth_date="2017-10-22")
+        _childcontract_create(c, start="2018-01-01", end="2022-01-01")
+    with django_assert_max_num_queries(len(ctx.captured_queries)):
+        response = admin_client.get(reverse("kitamanager:child-list") + "?historydate=2020-06-01")
+    assert response.status_code == 200
+    assert response.context["object_list"].count() == 30
+
+
 @pytest.mark.django_db
 def test_child_detail(admin_client):
     e = Child.objects.create(first_name="1", last_name="11", birth_date="2017-10-22")
@@ -93,7 +148,7 @@ def test_childpayment_detail(admin_client):
 
 
 @pytest.mark.django_db
-def test_child_charts_count_by_month(admin_client):
+def test_child_charts_count_by_month(admin_client, django_capture_on_commit_callbacks):
     """
     Test the child_charts_count_by_month() view which returns json
     """
@@ -123,9 +178,10 @@ def test_child_charts_count_by_month(admin_client):
         {"label": 2021, "data": [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], "backgroundColor": "#003f5c"},
     ]
 
-    # with some data
-    e = Child.objects.create(first_name="1", last_name="11", birth_date="2017-10-22")
-    _childcontract_create(e, start="2019-01-01", end="2019-12-31")
+    # with some (committed) data
+    with django_capture_on_commit_callbacks(execute=True):
+        e = Child.objects.create(first_name="1", last_name="11", birth_date="2017-10-22")
+        _childcontract_create(e, start="2019-01-01", end="2019-12-31")
     response = admin_client.get(reverse("kitamanager:child-charts-count-by-month") + "?historydate=2020-06-01")
     assert response.status_code == 200
     assert response.json()["data"]["datasets"] == [
@@ -135,3 +191,34 @@ def test_child_charts_count_by_month(admin_client):
         {"label": 2020, "data": [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], "backgroundColor": "#58508d"},
         {"label": 2021, "data": [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], "backgroundColor": "#003f5c"},
     ]
+
+
+@pytest.mark.django_db
+def test_child_charts_count_by_month_first_day(admin_client):
+    """
+    The children are counted at the first day of each month (not at the day of the historydate)
+    and the missing monthly facts are stored by the GET request
+    """
+    e = Child.objects.create(first_name="1", last_name="11", birth_date="2017-10-22")
+    _childcontract_create(e, start="2019-03-10", end="2019-05-20")
+    assert MonthlyFact.objects.count() == 0
+    response = admin_client.get(reverse("kitamanager:child-charts-count-by-month") + "?historydate=2020-06-15")
+    assert response.status_code == 200
+    assert response.json()["data"]["datasets"][2]["data"][:6] == [0, 0, 0, 1, 1, 0]
+    assert MonthlyFact.objects.filter(area__isnull=True).count() == 60
+
+
+@pytest.mark.django_db
+def test_child_charts_pay_income_vs_invoice(admin_client):
+    """
+    Test the child_charts_pay_income_vs_invoice() view which returns json
+    """
+    e = Child.objects.create(first_name="1", last_name="11", birth_date="2019-10-22")
+    _childcontract_create(e, start="2020-01-01", end="2021-06-01")
+    response = admin_client.get(reverse("kitamanager:child-charts-pay-income-vs-invoice") + "?historydate=2021-06-01")
+    assert response.status_code == 200
+    assert response.json()["title"] == "Calculated children payment vs. invoice"
+    assert len(response.json()["data"]["labels"]) == 41
+    assert response.json()["data"]["labels"][0] == "2019-01"
+    assert response.json()["data"]["datasets"][0]["data"][11:14] == ["0.00", "200.00", "200.00"]
+    assert response.json()["data"]["datasets"][1]["data"][12] is None
@@ -0,0 +1,87 @@
+import pytest
+import datetime
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from kitamanager.models import Area, Employee, EmployeeContract, EmployeePaymentPlan, EmployeeQualification
+
+EMPLOYEE_FILE = """
+mitarbeiter:
+  - first_name: e1
+    last_name: e1
+    birth_date: 1990-01-01
+    contracts:
+      - begin: 2020-01-01
+        end: 2021-01-01
+        area: area1
+        qualification: q1
+        hours_child: 30
+        hours_management: 0
+        hours_team: 2.5
+        hours_misc: 0
+        pay_group: 8
+        pay_level: 2
+      - begin: 2021-01-01
+        end: 2022-01-01
+        area: Sonstiges
+        qualification: q2
+        hours_child: 0
+        hours_management: 0
+        hours_team: 0
+        hours_misc: 20
+        pay_group: 3
+        pay_level: 1
+"""
+
+
+def _employee_import(tmp_path, content, *args):
+    employee_file = tmp_path / "employees.yaml"
+    employee_file.write_text(content)
+    out = StringIO()
+    call_command("employee_import", "plan1", str(employee_file), *args, stdout=out)
+    return out.getvalue()
+
+
+@pytest.mark.django_db
+def test_employee_import(tmp_path):
+    EmployeePaymentPlan.objects.create(name="plan1")
+    out = _employee_import(tmp_path, EMPLOYEE_FILE)
+    assert out.startswith(
+        "Done: areas: 2 created, qualifications: 2 created, employees: 1 created, contracts: 2 created, 0 updated "
+        "(3 rows"
+    )
+    assert "rows/s)" in out
+    assert Area.objects.get(name="Sonstiges").educational is False
+    assert EmployeeQualification.objects.count() == 2
+    e1 = Employee.objects.get()
+    contract = e1.contracts.get(start=datetime.date(2020, 1, 1))
+    assert contract.hours_team == 2.5
+    assert (contract.area_id, contract.qualification_id, contract.pay_group, contract.pay_level) == (
+        "area1",
+        "q1",
+        8,
+        2,
+    )
+
+    # a second import of the same file does not write anything
+    with CaptureQueriesContext(connection) as ctx:
+        out = _employee_import(tmp_path, EMPLOYEE_FILE)
+    assert out.startswith(
+        "Done: areas: 0 created, qualifications: 0 created, employees: 0 created, contracts: 0 created"
+    )
+    assert not [q for q in ctx.captured_queries if q["sql"].startswith(("INSERT", "UPDATE", "DELETE"))]
+
+    # changed contracts are updated
+    out = _employee_import(tmp_path, EMPLOYEE_FILE.replace("hours_misc: 20", "hours_misc: 25"))
+    assert "contracts: 0 created, 1 updated" in out
+    assert EmployeeContract.objects.get(start=datetime.date(2021, 1, 1)).hours_misc == 25
+
+
+@pytest.mark.django_db
+def test_employee_import_dry_run(tmp_path):
+    EmployeePaymentPlan.objects.create(name="plan1")
+    out = _employee_import(tmp_path, EMPLOYEE_FILE, "--dry-run")
+    assert out.startswith("Dry run: ")
+    assert Employee.objects.count() == 0
+    assert EmployeeContract.objects.count() == 0
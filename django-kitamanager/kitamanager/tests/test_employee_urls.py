@@ -1,6 +1,9 @@
 import pytest
 import datetime
+from decimal import Decimal
 from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from kitamanager.tests.common import _employeecontract_create
 from kitamanager.models import Employee, EmployeePaymentPlan, Area
 
@@ -22,6 +25,28 @@ def test_employee_list(admin_client):
     assert response.status_code == 200
 
 
+@pytest.mark.django_db
+def test_employee_list_num_queries(admin_client, django_assert_max_num_queries):
+    """
+    The number of queries for the employee list does not depend on the number of employees
+    """
+    for i in range(3):
+        e = Employee.objects.create(first_name=f"{i}", last_name=f"{i}", birth_date="1980-10-22")
+        _employeecontract_create(e, start="2020-01-01", end="2020-12-31")
+    with CaptureQueriesContext(connection) as ctx:
+        response = admin_client.get(reverse("kitamanager:employee-list") + "?historydate=2020-06-01")
+    assert response.status_code == 200
+
+    for i in range(3, 30):
+        e = Employee.objects.create(first_name=f"{i}", last_name=f"{i}", birth_date="1980-10-22")
+        _employeecontract_create(e, start="2020-01-01", end="2020-12-31")
+    with django_assert_max_num_queries(len(ctx.captured_queries)):
+        response = admin_client.get(reverse("kitamanager:employee-list") + "?historydate=2020-06-01")
+    assert response.status_code == 200
+    assert response.context["object_list"].count() == 30
+    assert response.context["sum_salaries"] == Decimal("3000")
+
+
 @pytest.mark.django_db
 def test_employee_list_csv(admin_client):
     historydate = datetime.date.today()
@@ -30,12 +55,48 @@ def test_employee_list_csv(admin_client):
     assert response.headers["Content-Type"] == "text/csv"
     assert response.headers["Content-Disposition"] == f'attachment; filename="employee-list-{historydate}.csv"'
     assert (
-        response.content.decode() == "ID,First Name,Last Name,Begin date,pay plan,pay group,pay level,pay "
+        response.getvalue().decode() == "ID,First Name,Last Name,Begin date,pay plan,pay group,pay level,pay "
         "level next,area,qualification,hours child per week,hours management per week,"
         "hours team per week,hours misc per week,monthly salary (Euro)\r\n"
     )
 
 
+@pytest.mark.django_db
+def test_employee_list_csv_months(admin_client):
+    e1 = Employee.objects.create(first_name="1", last_name="11", birth_date="1990-01-01")
+    _employeecontract_create(e1, start="2020-01-01", end="2020-03-01")
+    response = admin_client.get(reverse("kitamanager:employee-list-csv-months") + "?start=2020-01-01&end=2021-01-01")
+    assert response.status_code == 200
+    assert response.streaming
+    lines = response.getvalue().decode().splitlines()
+    assert lines[0].startswith("Month,ID,First Name")
+    assert lines[1:] == [
+        f"2020-01-01,{e1.pk},1,11,2020-01-01,plan1,1,1,2021-01-01,area1,qualification1,37.00,0.00,2.00,0.00,100.00",
+        f"2020-02-01,{e1.pk},1,11,2020-01-01,plan1,1,1,2021-01-01,area1,qualification1,37.00,0.00,2.00,0.00,100.00",
+    ]
+    # an invalid range falls back to the current year
+    response = admin_client.get(reverse("kitamanager:employee-list-csv-months") + "?start=2021-01-01&end=2020-01-01")
+    assert response.status_code == 200
+    assert response.getvalue().decode().splitlines()[1:] == []
+
+
+@pytest.mark.django_db
+def test_employee_bonuspayment(admin_client, django_assert_max_num_queries):
+    # without data
+    response = admin_client.get(reverse("kitamanager:employee-bonuspayment"))
+    assert response.status_code == 200
+    # with data
+    for i in range(10):
+        e = Employee.objects.create(first_name=f"{i}", last_name=f"{i}", birth_date="1980-10-22")
+        _employeecontract_create(e, start="2020-07-01", end="2021-01-01", hours_child=37, hours_team=2)
+    with django_assert_max_num_queries(10):
+        response = admin_client.get(reverse("kitamanager:employee-bonuspayment") + "?year=2020&pay=1200")
+    assert response.status_code == 200
+    assert len(response.context["data"]) == 10
+    assert response.context["data"]["0, 0"]["total"] == Decimal("600")
+    assert response.context["pay_total_all"] == Decimal("6000")
+
+
 @pytest.mark.django_db
 def test_employee_detail(admin_client):
     e = Employee.objects.create(first_name="1", last_name="11", birth_date="2017-10-22")
@@ -0,0 +1,15 @@
+from io import StringIO
+from django.core.management import call_command
+
+
+def test_import_time():
+    out = StringIO()
+    call_command("import_time", "--limit", "100000", stdout=out)
+    lines = out.getvalue().splitlines()
+    assert lines[0].endswith("ms")
+    modules = [line.split()[-1] for line in lines[2:]]
+    assert "kmsite.urls" in modules
+    assert "kitamanager.admin.revenue" in modules
+    # the document parsers (and their dependencies) are only imported when a file is uploaded
+    for module in ["kitamanager.berlin", "kitamanager.bankimport", "kitamanager.sage_payroll", "openpyxl", "pypdf"]:
+        assert module not in modules
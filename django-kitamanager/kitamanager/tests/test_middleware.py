@@ -0,0 +1,72 @@
+import logging
+import pytest
+from django.urls import reverse
+from kitamanager.middleware import query_stats, query_stats_reset
+from kitamanager.models import Child
+from kitamanager.tests.common import _childcontract_create
+
+
+@pytest.fixture(autouse=True)
+def reset_query_stats():
+    query_stats_reset()
+
+
+@pytest.mark.django_db
+def test_query_stats_middleware(admin_client):
+    child = Child.objects.create(first_name="c1", last_name="c1", birth_date="2019-01-01")
+    _childcontract_create(child, start="2019-01-01", end="2099-01-01")
+    response = admin_client.get(reverse("kitamanager:child-list"))
+    assert response.status_code == 200
+    sql, total = response["Server-Timing"].split(", ")
+    assert sql.startswith("sql;dur=")
+    assert sql.endswith(' queries"')
+    assert total.startswith("total;dur=")
+
+    admin_client.get(reverse("kitamanager:child-list"))
+    stats = query_stats()["kitamanager:child-list"]
+    assert stats.requests == 2
+    assert stats.queries_max > 0
+    assert stats.queries >= stats.queries_max
+    assert stats.time >= stats.sql_time > 0
+
+
+@pytest.mark.django_db
+def test_query_stats_middleware_budget(admin_client, settings, caplog):
+    settings.KITAMANAGER_QUERY_BUDGETS = {"child-list": 1}
+    with caplog.at_level(logging.WARNING, logger="kitamanager.middleware"):
+        admin_client.get(reverse("kitamanager:child-list"))
+    assert "kitamanager:child-list (/child/) ran" in caplog.text
+    assert "(budget: 1)" in caplog.text
+
+    # within the budget
+    caplog.clear()
+    settings.KITAMANAGER_QUERY_BUDGETS = {"kitamanager:child-list": 100}
+    with caplog.at_level(logging.WARNING, logger="kitamanager.middleware"):
+        admin_client.get(reverse("kitamanager:child-list"))
+    assert caplog.text == ""
+
+
+@pytest.mark.parametrize(
+    "slow_ms,sample_rate,logged",
+    [
+        # every query (development)
+        (0, 1.0, True),
+        # disabled
+        (-1, 1.0, False),
+        # nothing is that slow
+        (100000, 1.0, False),
+        # nothing sampled
+        (0, 0.0, False),
+    ],
+)
+@pytest.mark.django_db
+def test_query_stats_middleware_slow_queries(admin_client, settings, caplog, slow_ms, sample_rate, logged):
+    settings.KITAMANAGER_SLOW_QUERY_MS = slow_ms
+    settings.KITAMANAGER_SLOW_QUERY_SAMPLE_RATE = sample_rate
+    with caplog.at_level(logging.INFO, logger="kitamanager.sql"):
+        admin_client.get(reverse("kitamanager:child-list"))
+    records = [r for r in caplog.records if r.name == "kitamanager.sql"]
+    assert bool(records) is logged
+    if logged:
+        assert records[-1].getMessage().startswith("kitamanager:child-list: ")
+        assert "SELECT" in records[-1].getMessage()
@@ -0,0 +1,29 @@
+from kitamanager import parallel
+
+
+def test_parallel_map_in_process(monkeypatch):
+    """
+    A single job does not start a process pool
+    """
+
+    def _pool(*args, **kwargs):
+        raise AssertionError("no process pool expected")
+
+    monkeypatch.setattr(parallel, "ProcessPoolExecutor", _pool)
+    assert parallel.parallel_map(divmod, [7, 9], [2, 4], jobs=1) == [(3, 1), (2, 1)]
+
+
+def test_parallel_map_spawn(monkeypatch):
+    """
+    Multiple jobs run in spawned (not forked) processes
+    """
+    contexts = []
+    pool = parallel.ProcessPoolExecutor
+
+    def _pool(*args, **kwargs):
+        contexts.append(kwargs["mp_context"].get_start_method())
+        return pool(*args, **kwargs)
+
+    monkeypatch.setattr(parallel, "ProcessPoolExecutor", _pool)
+    assert parallel.parallel_map(divmod, [7, 9], [2, 4], jobs=2) == [(3, 1), (2, 1)]
+    assert contexts == ["spawn"]
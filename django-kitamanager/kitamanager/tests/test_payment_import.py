@@ -0,0 +1,100 @@
+import pytest
+import datetime
+import os
+from decimal import Decimal
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from kitamanager.models import (
+    ChildPaymentTable,
+    ChildPaymentTableEntry,
+    EmployeePaymentTable,
+    EmployeePaymentTableEntry,
+)
+
+BERLIN_FILE = os.path.join(settings.BASE_DIR, "child-payments", "berlin.yaml")
+
+EMPLOYEE_PAYMENT_FILE = """
+- from: 2020-01-01
+  to: 2021-01-01
+  hours: 39.4
+  entries:
+    8:
+      1: 3000.10
+      2: 3200
+    9:
+      1: 3500
+- from: "2021-01-01"
+  to: "2022-01-01"
+  hours: 39
+  entries:
+    8:
+      1: 3100
+"""
+
+
+def _import(command, path, *args):
+    out = StringIO()
+    call_command(command, "plan1", str(path), *args, stdout=out)
+    return out.getvalue().strip()
+
+
+@pytest.mark.django_db
+def test_childpayment_import(tmp_path):
+    out = _import("childpayment_import", BERLIN_FILE)
+    assert out.startswith("Done: plan plan1 (newly created? True), tables: ")
+    tables = ChildPaymentTable.objects.count()
+    entries = ChildPaymentTableEntry.objects.count()
+    assert tables > 0
+    assert out.endswith(
+        f"tables: {tables} created, 0 updated, entries: {entries} created, 0 updated, 0 deleted, 0 unchanged"
+    )
+
+    # a second import does not write anything
+    with CaptureQueriesContext(connection) as ctx:
+        out = _import("childpayment_import", BERLIN_FILE)
+    assert out.endswith(f"entries: 0 created, 0 updated, 0 deleted, {entries} unchanged")
+    assert not [q for q in ctx.captured_queries if q["sql"].startswith(("INSERT", "UPDATE", "DELETE"))]
+
+    # a changed and a removed entry
+    with open(BERLIN_FILE) as f:
+        content = f.read()
+    changed = tmp_path / "berlin.yaml"
+    changed.write_text(
+        content.replace("'payment': 1656.80", "'payment': 1700.00", 1).replace(
+            "        'ndh':\n          'payment': 102.66\n          'requirement': 0.017\n", "", 1
+        )
+    )
+    out = _import("childpayment_import", changed)
+    assert out.endswith(f"entries: 0 created, 1 updated, 1 deleted, {entries - 2} unchanged")
+    assert ChildPaymentTableEntry.objects.filter(pay=Decimal("1700")).count() == 1
+
+
+@pytest.mark.django_db
+def test_employeepayment_import(tmp_path):
+    payment_file = tmp_path / "payment.yaml"
+    payment_file.write_text(EMPLOYEE_PAYMENT_FILE)
+    out = _import("employeepayment_import", payment_file)
+    assert out == (
+        "Done: plan plan1 (newly created? True), tables: 2 created, 0 updated, "
+        "entries: 4 created, 0 updated, 0 deleted, 0 unchanged"
+    )
+    table = EmployeePaymentTable.objects.get(start=datetime.date(2020, 1, 1))
+    assert table.hours == Decimal("39.4")
+    assert table.entries.get(pay_group=8, pay_level=1).salary == Decimal("3000.10")
+
+    out = _import("employeepayment_import", payment_file)
+    assert out.endswith("tables: 0 created, 0 updated, entries: 0 created, 0 updated, 0 deleted, 4 unchanged")
+
+    payment_file.write_text(
+        EMPLOYEE_PAYMENT_FILE.replace("hours: 39\n", "hours: 38.5\n").replace("      2: 3200\n", "")
+    )
+    out = _import("employeepayment_import", payment_file, "--dry-run")
+    assert out.startswith("Dry run: ")
+    assert out.endswith("tables: 0 created, 1 updated, entries: 0 created, 0 updated, 1 deleted, 3 unchanged")
+    assert EmployeePaymentTableEntry.objects.count() == 4
+    out = _import("employeepayment_import", payment_file)
+    assert EmployeePaymentTableEntry.objects.count() == 3
+    assert EmployeePaymentTable.objects.get(start=datetime.date(2021, 1, 1)).hours == Decimal("38.5")
@@ -0,0 +1,88 @@
+import datetime
+import subprocess
+import sys
+import pytest
+from decimal import Decimal
+from io import BytesIO
+from pypdf import PdfWriter
+from pypdf.generic import ContentStream, DictionaryObject, NameObject
+from kitamanager.sage_payroll import PayrollPerson, SagePayrolls, parse_month
+
+
+def _payroll_pdf(pages):
+    """
+    A minimal PDF with the given lines of text on every page
+    """
+    writer = PdfWriter()
+    font = DictionaryObject(
+        {
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        }
+    )
+    for lines in pages:
+        page = writer.add_blank_page(width=595, height=842)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+        )
+        content = ContentStream(None, None)
+        content.set_data(
+            "".join(f"BT /F1 10 Tf 50 {800 - 20 * i} Td ({line}) Tj ET\n" for i, line in enumerate(lines)).encode()
+        )
+        page.replace_contents(content)
+    out = BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_sage_payrolls(jobs, monkeypatch):
+    # use the process pool even for a few pages
+    monkeypatch.setattr(SagePayrolls, "PAGES_PER_JOB_MIN", 4)
+    pages = [["Abrechnungsmonat:", "Januar 2025#1", "TV-EM S6 (3)  30 h", f"First{n} Last{n}"] for n in range(12)]
+    payrolls = SagePayrolls(BytesIO(_payroll_pdf(pages)), jobs=jobs)
+    assert payrolls.date == datetime.datetime(2025, 1, 1)
+    assert payrolls.persons == [
+        PayrollPerson(first_name=f"First{n}", last_name=f"Last{n}", hours=Decimal("30"), pay_group=6, pay_level=3)
+        for n in range(12)
+    ]
+    # the pages are extracted once
+    assert payrolls.persons is payrolls.persons
+
+
+def test_sage_payrolls_serial_by_default(monkeypatch):
+    """
+    Without jobs (eg. for an upload) no processes are started
+    """
+
+    def _parallel_map(*args, **kwargs):
+        raise AssertionError("no process pool expected")
+
+    monkeypatch.setattr("kitamanager.sage_payroll.parallel_map", _parallel_map)
+    pages = [["Abrechnungsmonat:", "Januar 2025#1", "TV-EM S6 (3)  30 h", f"First{n} Last{n}"] for n in range(12)]
+    assert len(SagePayrolls(BytesIO(_payroll_pdf(pages))).persons) == 12
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("Januar 2025", datetime.datetime(2025, 1, 1)),
+        ("März 2024", datetime.datetime(2024, 3, 1)),
+        (" Dez. 2023 ", datetime.datetime(2023, 12, 1)),
+        ("OKTOBER 2022", datetime.datetime(2022, 10, 1)),
+        ("01/2025", datetime.datetime(2025, 1, 1)),
+        ("11.2024", datetime.datetime(2024, 11, 1)),
+        # not a Sage format, parsed by dateparser
+        ("2025-02-17", datetime.datetime(2025, 2, 1)),
+        ("no date", None),
+    ],
+)
+def test_parse_month(value, expected):
+    assert parse_month(value) == expected
+
+
+def test_sage_payrolls_import_without_dateparser():
+    # dateparser is slow to import and only needed for unknown formats
+    code = "import sys, kitamanager.sage_payroll; print('dateparser' in sys.modules)"
+    assert subprocess.check_output([sys.executable, "-c", code], text=True).strip() == "False"
@@ -1,5 +1,11 @@
+import datetime
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from kitamanager.cache import DATA_VERSION, version_get
+from kitamanager.models import Area, Child, Employee, MonthlyFact
+from kitamanager.tests.common import _childcontract_create, _employeecontract_create
 
 
 @pytest.mark.django_db
@@ -66,3 +72,107 @@ def test_statistic_charts_child_requirement_vs_employee_hours_percent(admin_clie
         "2020-10",
         "2020-11",
     ]
+
+
+@pytest.mark.django_db
+def test_statistic_charts_cached(admin_client, django_assert_num_queries, django_capture_on_commit_callbacks):
+    """
+    Test that a chart response is cached until any data changes
+    """
+    url = reverse("kitamanager:statistic-charts-child-requirement-vs-employee-hours") + "?historydate=2020-06-01"
+    response = admin_client.get(url)
+    assert response.status_code == 200
+    assert response.json()["data"]["datasets"][0]["data"][7] == "0.00000"
+    # served from the cache (only the session and the user are queried)
+    with django_assert_num_queries(2):
+        response_cached = admin_client.get(url)
+    assert response_cached.content == response.content
+    assert response_cached["Content-Type"] == "application/json"
+    # another historydate is not cached
+    response = admin_client.get(url.replace("2020-06-01", "2020-07-01"))
+    assert response.json()["data"]["labels"][0] == "2019-07"
+    # changed data invalidates the cached response (once committed)
+    version = version_get(DATA_VERSION)
+    with django_capture_on_commit_callbacks(execute=True):
+        child = Child.objects.create(first_name="c1", last_name="c1", birth_date="2019-01-01")
+        _childcontract_create(child, start="2019-01-01", end="2021-01-01")
+        # not before the commit, a concurrent request would cache the old data for the new version
+        assert version_get(DATA_VERSION) == version
+    assert version_get(DATA_VERSION) != version
+    response = admin_client.get(url)
+    assert response.json()["data"]["datasets"][0]["data"][7] == "3.94000"
+
+
+@pytest.mark.django_db
+def test_statistic_charts_staffing_series_shared(admin_client, django_assert_num_queries):
+    """
+    Both requirement vs. employee hours charts are formatted from the same staffing series
+    """
+    child = Child.objects.create(first_name="c1", last_name="c1", birth_date="2019-01-01")
+    _childcontract_create(child, start="2019-01-01", end="2021-01-01")
+    response = admin_client.get(
+        reverse("kitamanager:statistic-charts-child-requirement-vs-employee-hours") + "?historydate=2020-06-01"
+    )
+    assert response.json()["data"]["datasets"][0]["data"][7] == "3.94000"
+    # the series is not computed again (only the session and the user are queried)
+    with django_assert_num_queries(2):
+        response = admin_client.get(
+            reverse("kitamanager:statistic-charts-child-requirement-vs-employee-hours-percent")
+            + "?historydate=2020-06-01"
+        )
+    assert response.json()["data"]["labels"][0] == "2019-06"
+    assert response.json()["data"]["datasets"][0]["data"][7] == "-100"
+
+
+@pytest.mark.django_db
+def test_statistic_staffing_gap(admin_client):
+    """
+    Test the staffing gap report and the json response (only educational areas)
+    """
+    response = admin_client.get(reverse("kitamanager:statistic-staffing-gap"))
+    assert response.status_code == 200
+
+    Area.objects.create(name="Sonstiges", educational=False)
+    child = Child.objects.create(first_name="c1", last_name="c1", birth_date="2019-01-01")
+    _childcontract_create(child, start="2019-01-01", end="2021-01-01")
+    employee = Employee.objects.create(first_name="e1", last_name="e1", birth_date="1990-01-01")
+    _employeecontract_create(employee, start="2020-01-01", end="2020-03-01", hours_child=10)
+
+    response = admin_client.get(reverse("kitamanager:statistic-staffing-gap"), {"historydate": "2020-01-15"})
+    assert response.status_code == 200
+    assert response.context["areas"] == ["area1"]
+    assert len(response.context["rows"]) == 24
+    month, (january,) = response.context["rows"][0]
+    assert str(month) == "2020-01-01"
+    assert january.gap == january.employee_hours - january.requirements_hours
+
+    response = admin_client.get(
+        reverse("kitamanager:statistic-charts-staffing-gap-by-area"), {"historydate": "2020-01-15"}
+    )
+    assert response.status_code == 200
+    assert response.json()["data"]["labels"][0] == "2020-01"
+    assert len(response.json()["data"]["labels"]) == 24
+    assert [d["label"] for d in response.json()["data"]["datasets"]] == ["area1"]
+    assert response.json()["data"]["datasets"][0]["data"][0] == str(january.gap)
+
+
+@pytest.mark.django_db
+def test_statistic_staffing_gap_queries():
+    """
+    The number of queries does not depend on the number of children
+    """
+    Area.objects.create(name="area2", educational=True)
+    queries = []
+    # the first run also loads the child payment rates
+    for count in range(3):
+        for n in range(5 * count + 1):
+            child = Child.objects.create(first_name=f"c{count}{n}", last_name="c", birth_date="2019-01-01")
+            _childcontract_create(child, start="2020-01-01", end="2021-01-01")
+        MonthlyFact.objects.all().delete()
+        with CaptureQueriesContext(connection) as ctx:
+            data = MonthlyFact.objects.staffing_series_group_by_area(
+                datetime.date(2020, 1, 1), datetime.date(2022, 1, 1)
+            )
+        queries.append(len(ctx.captured_queries))
+        assert list(data.keys()) == ["area1", "area2"]
+    assert queries[1] == queries[2]
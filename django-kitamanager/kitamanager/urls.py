@@ -4,6 +4,7 @@ from django.contrib.auth import views as auth_views
 from kitamanager.views_employee import (
     employee_list,
     employee_list_csv,
+    employee_list_csv_months,
     employee_detail,
     employee_statistics,
     employee_bonuspayment,
@@ -17,6 +18,7 @@ from kitamanager.views_bank import bankaccount_list, bankaccount_charts_sum_bala
 from kitamanager.views_child import (
     child_list,
     child_list_csv,
+    child_list_csv_months,
     child_list_future,
     child_detail,
     child_statistics,
@@ -30,6 +32,8 @@ from kitamanager.views_child import (
 from kitamanager.views_statistic import (
     statistic_charts_child_requirement_vs_employee_hours,
     statistic_charts_child_requirement_vs_employee_hours_percent,
+    statistic_charts_staffing_gap_by_area,
+    statistic_staffing_gap,
 )
 
 
@@ -45,6 +49,7 @@ urlpatterns = [
     path("employeepayment/<str:plan>/", employeepayment_detail, name="employeepayment-detail"),
     path("employee/", employee_list, name="employee-list"),
     path("employee/csv/", employee_list_csv, name="employee-list-csv"),
+    path("employee/csv/months/", employee_list_csv_months, name="employee-list-csv-months"),
     path("employee/statistics/", employee_statistics, name="employee-statistics"),
     path("employee/bonus/", employee_bonuspayment, name="employee-bonuspayment"),
     path("employee/check-sage-payroll", employee_check_sage_payroll, name="employee-check-sage-payroll"),
@@ -62,6 +67,7 @@ urlpatterns = [
     # child
     path("child/", child_list, name="child-list"),
     path("child/csv/", child_list_csv, name="child-list-csv"),
+    path("child/csv/months/", child_list_csv_months, name="child-list-csv-months"),
     path("child/future/", child_list_future, name="child-list-future"),
     path("child/statistics/", child_statistics, name="child-statistics"),
     path("child/<int:pk>/", child_detail, name="child-detail"),
@@ -93,6 +99,12 @@ urlpatterns = [
         statistic_charts_child_requirement_vs_employee_hours_percent,
         name="statistic-charts-child-requirement-vs-employee-hours-percent",
     ),
+    path(
+        "statistic/charts/staffing-gap-by-area/",
+        statistic_charts_staffing_gap_by_area,
+        name="statistic-charts-staffing-gap-by-area",
+    ),
+    path("statistic/staffing-gap/", statistic_staffing_gap, name="statistic-staffing-gap"),
     # bankaccount
     path("bankaccount/", bankaccount_list, name="bankaccount-list"),
     path(
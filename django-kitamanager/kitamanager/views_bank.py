@@ -8,6 +8,7 @@ from dateutil.relativedelta import relativedelta
 from django.http import JsonResponse
 from kitamanager.definitions import CHART_COLORS
 from django.contrib.auth.decorators import login_required
+from kitamanager.cache import cached_response
 
 
 @login_required
@@ -38,6 +39,7 @@ def bankaccount_list(request):
 
 
 @login_required
+@cached_response
 def bankaccount_charts_sum_balance_by_month(request):
     """
     JSON response of BankAccountEntry with monthly values
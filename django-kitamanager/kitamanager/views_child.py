@@ -1,15 +1,19 @@
 import datetime
 from django.contrib.auth.decorators import login_required
+from kitamanager.cache import cached_response
 from django import forms
 from django.utils.translation import gettext_lazy as _
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render
-from kitamanager.forms import HistoryDateForm
-from kitamanager.models import Child, ChildContract, ChildPaymentPlan, ChildPaymentTable, RevenueEntry
+from kitamanager.forms import DateRangeForm, HistoryDateForm
+from kitamanager.models import Child, ChildContract, ChildPaymentPlan, ChildPaymentTable, MonthlyFact, RevenueEntry
 from dateutil.relativedelta import relativedelta
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from kitamanager.definitions import CHART_COLORS, REVENUE_NAME_BERLIN
-import csv
+from django.db.models import F, Value
+from kitamanager.csv_export import CSV_CHUNK_SIZE, csv_response
+from kitamanager.models.common import Age, months_between
+from typing import Dict, Iterator, List
 
 
 @login_required
@@ -26,7 +30,12 @@ def child_list(request):
 
     sum_requirements, sum_requirements_hours_per_week = ChildContract.objects.sum_requirements(date=historydate)
     context = dict(
-        object_list=ChildContract.objects.by_date(historydate),
+        object_list=(
+            ChildContract.objects.by_date(historydate)
+            .select_related("pay_plan")
+            .with_payment(historydate)
+            .with_requirement(historydate)
+        ),
         sum_payments=ChildContract.objects.sum_payments(date=historydate),
         sum_requirements=sum_requirements,
         sum_requirements_hours_per_week=sum_requirements_hours_per_week,
@@ -40,6 +49,50 @@ def child_list(request):
     )
 
 
+CHILD_CSV_HEADER = [
+    "ID",
+    "First Name",
+    "Last Name",
+    "Age",
+    "Voucher",
+    "Area",
+    "Pay tags",
+    "Requirement (full time person)",
+    "Payment (Euro)",
+]
+
+
+def _child_csv_rows(date: datetime.date) -> Iterator[List]:
+    """
+    The CSV rows for all children at the given date
+    All values are computed by the database and fetched in chunks (server side cursor)
+    """
+    rows = (
+        ChildContract.objects.by_date(date)
+        .with_payment(date)
+        .with_requirement(date)
+        .annotate(person_age=Age(Value(date), F("person__birth_date")))
+        .values_list(
+            "person_id",
+            "person__first_name",
+            "person__last_name",
+            "person_age",
+            "person__voucher",
+            "area_id",
+            "area__educational",
+            "pay_tags",
+            "requirement_sum",
+            "payment_sum",
+        )
+    )
+    for pk, first_name, last_name, age, voucher, area, educational, pay_tags, requirement, payment in rows.iterator(
+        chunk_size=CSV_CHUNK_SIZE
+    ):
+        # same as str(Area)
+        area = f"{area} (educational: {educational})"
+        yield [pk, first_name, last_name, age, voucher, area, pay_tags, requirement, payment]
+
+
 @login_required
 def child_list_csv(request):
     """
@@ -55,40 +108,22 @@ def child_list_csv(request):
     else:
         form = HistoryDateForm()
 
-    response = HttpResponse(
-        content_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="child-list-{historydate}.csv"'},
-    )
-    writer = csv.writer(response)
-    # header row
-    writer.writerow(
-        [
-            "ID",
-            "First Name",
-            "Last Name",
-            "Age",
-            "Voucher",
-            "Area",
-            "Pay tags",
-            "Requirement (full time person)",
-            "Payment (Euro)",
-        ]
-    )
-    for child in ChildContract.objects.by_date(historydate):
-        writer.writerow(
-            [
-                child.person.pk,
-                child.person.first_name,
-                child.person.last_name,
-                child.person.age(historydate),
-                child.person.voucher,
-                child.area,
-                child.pay_tags,
-                child.requirement(historydate)[0],
-                child.payment(historydate),
-            ]
-        )
-    return response
+    return csv_response(f"child-list-{historydate}.csv", CHILD_CSV_HEADER, _child_csv_rows(historydate))
+
+
+@login_required
+def child_list_csv_months(request):
+    """
+    Get a list of children for each month within a date range as CSV (one row per contract and month)
+    """
+    today = datetime.date.today()
+    start, end = today.replace(month=1, day=1), today.replace(month=1, day=1) + relativedelta(years=1)
+    form = DateRangeForm(request.GET)
+    if form.is_valid():
+        start, end = form.cleaned_data["start"], form.cleaned_data["end"]
+
+    rows = ([month] + row for month in months_between(start, end) for row in _child_csv_rows(month))
+    return csv_response(f"child-list-{start}-{end}.csv", ["Month"] + CHILD_CSV_HEADER, rows)
 
 
 @login_required
@@ -178,6 +213,7 @@ def childpayment_detail(request, plan):
 
 
 @login_required
+@cached_response
 def child_charts_count_group_by_area(request):
     """
     JSON response ChildContracts count at a given historydate grouped by area
@@ -210,17 +246,22 @@ def child_charts_count_group_by_area(request):
 
 
 @login_required
+@cached_response
 def child_charts_count_by_month(request):
     """
     JSON response ChildContracts count at a given historydate for some years in the past
     and some years in the future
+    The children are counted at the first day of each month (see MonthlyFactManager.by_month())
     Useful for charts
     """
     historydate = forms.DateField().clean(request.GET.get("historydate", datetime.date.today()))
 
-    data = ChildContract.objects.count_by_month(
-        historydate - relativedelta(years=3, month=1), historydate + relativedelta(years=2, month=1, day=1)
+    facts = MonthlyFact.objects.by_month(
+        historydate - relativedelta(years=3, month=1, day=1), historydate + relativedelta(years=2, month=1, day=1)
     )
+    data: Dict[int, List[int]] = dict()
+    for month, fact in facts.items():
+        data.setdefault(month.year, []).append(fact.children)
 
     datasets = []
     month_labels = [
@@ -255,15 +296,17 @@ def child_charts_count_by_month(request):
 
 
 @login_required
+@cached_response
 def child_charts_pay_income_vs_invoice(request):
     """
     JSON response for comparing the calculated pay income for all children vs.
     the invoice received
+    The payments are calculated for the first day of each month (see MonthlyFactManager.by_month())
     Useful for charts
     """
     historydate = forms.DateField().clean(request.GET.get("historydate", datetime.date.today()))
-    dt_from = historydate - relativedelta(years=2, month=1)
-    dt_to = historydate + relativedelta(years=1, month=6)
+    dt_from = historydate - relativedelta(years=2, month=1, day=1)
+    dt_to = historydate + relativedelta(years=1, month=6, day=1)
 
     invoice_name = REVENUE_NAME_BERLIN
     labels = []
@@ -280,16 +323,12 @@ def child_charts_pay_income_vs_invoice(request):
         },
     ]
 
-    current = dt_from
-    while current < dt_to:
-        labels.append(current.strftime("%Y-%m"))
-        datasets[0]["data"].append(ChildContract.objects.sum_payments(current))
-        revenue_item = RevenueEntry.objects.by_date(current).filter(name=invoice_name).first()
-        if revenue_item:
-            datasets[1]["data"].append(revenue_item.pay)
-        else:
-            datasets[1]["data"].append(None)
-        current = current + relativedelta(months=1)
+    facts = MonthlyFact.objects.by_month(dt_from, dt_to)
+    invoices = RevenueEntry.objects.pay_by_month(invoice_name, dt_from, dt_to)
+    for month, fact in facts.items():
+        labels.append(month.strftime("%Y-%m"))
+        datasets[0]["data"].append(fact.payments)
+        datasets[1]["data"].append(invoices[month])
 
     return JsonResponse(
         {
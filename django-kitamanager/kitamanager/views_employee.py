@@ -1,16 +1,18 @@
 from django.contrib.auth.decorators import login_required
+from kitamanager.cache import cached_response, parse_upload
 from django.shortcuts import render, get_object_or_404
 from django import forms
 from kitamanager.models import EmployeeContract, Employee, EmployeePaymentPlan, EmployeePaymentTable
-from kitamanager.forms import HistoryDateForm, EmployeeBonusPaymentForm, EmployeeCheckSagePayrollForm
-from kitamanager.sage_payroll import SagePayrolls
+from kitamanager.forms import DateRangeForm, HistoryDateForm, EmployeeBonusPaymentForm, EmployeeCheckSagePayrollForm
 from django.utils.translation import gettext_lazy as _
 import datetime
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from kitamanager.definitions import CHART_COLORS, SALARY_EMPLOYER_ADDITION
 from decimal import Decimal
-from typing import Dict, List
-import csv
+from typing import Dict, Iterator, List
+from dateutil.relativedelta import relativedelta
+from kitamanager.csv_export import CSV_CHUNK_SIZE, csv_response
+from kitamanager.models.common import months_between
 
 
 @login_required
@@ -31,7 +33,11 @@ def employee_list(request):
     sum_salaries = EmployeeContract.objects.sum_salaries(date=historydate)
     sum_salaries_plus_employer_addition = sum_salaries + sum_salaries * Decimal(f"{SALARY_EMPLOYER_ADDITION}")
     context = dict(
-        object_list=EmployeeContract.objects.by_date(date=historydate),
+        object_list=(
+            EmployeeContract.objects.by_date(date=historydate)
+            .select_related("pay_plan", "qualification")
+            .with_salary(historydate)
+        ),
         sum_hours=EmployeeContract.objects.sum_hours(date=historydate),
         sum_salaries=sum_salaries,
         sum_salaries_plus_employer_addition=sum_salaries_plus_employer_addition,
@@ -47,6 +53,56 @@ def employee_list(request):
     )
 
 
+EMPLOYEE_CSV_HEADER = [
+    "ID",
+    "First Name",
+    "Last Name",
+    "Begin date",
+    "pay plan",
+    "pay group",
+    "pay level",
+    "pay level next",
+    "area",
+    "qualification",
+    "hours child per week",
+    "hours management per week",
+    "hours team per week",
+    "hours misc per week",
+    "monthly salary (Euro)",
+]
+
+
+def _employee_csv_rows(date: datetime.date) -> Iterator[List]:
+    """
+    The CSV rows for all employees at the given date
+    All values are computed by the database and fetched in chunks (server side cursor)
+    """
+    rows = (
+        EmployeeContract.objects.by_date(date=date)
+        .with_salary(date)
+        .values_list(
+            "person_id",
+            "person__first_name",
+            "person__last_name",
+            "begin_date",
+            "pay_plan_id",
+            "pay_group",
+            "pay_level",
+            "pay_level_next",
+            "area_id",
+            "qualification_id",
+            "hours_child",
+            "hours_management",
+            "hours_team",
+            "hours_misc",
+            "salary",
+        )
+    )
+    for *row, salary in rows.iterator(chunk_size=CSV_CHUNK_SIZE):
+        # the salary is computed with the full database precision
+        yield row + [round(salary, 2) if salary is not None else None]
+
+
 @login_required
 def employee_list_csv(request):
     """
@@ -62,52 +118,22 @@ def employee_list_csv(request):
     else:
         form = HistoryDateForm()
 
-    response = HttpResponse(
-        content_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="employee-list-{historydate}.csv"'},
-    )
-    writer = csv.writer(response)
-    # header row
-    writer.writerow(
-        [
-            "ID",
-            "First Name",
-            "Last Name",
-            "Begin date",
-            "pay plan",
-            "pay group",
-            "pay level",
-            "pay level next",
-            "area",
-            "qualification",
-            "hours child per week",
-            "hours management per week",
-            "hours team per week",
-            "hours misc per week",
-            "monthly salary (Euro)",
-        ]
-    )
-    for employee in EmployeeContract.objects.by_date(date=historydate):
-        writer.writerow(
-            [
-                employee.person.pk,
-                employee.person.first_name,
-                employee.person.last_name,
-                employee.person.begin_date,
-                employee.pay_plan.name,
-                employee.pay_group,
-                employee.pay_level,
-                employee.person.pay_level_next(historydate),
-                employee.area.name,
-                employee.qualification.name,
-                employee.hours_child,
-                employee.hours_management,
-                employee.hours_team,
-                employee.hours_misc,
-                employee.person.salary(historydate),
-            ]
-        )
-    return response
+    return csv_response(f"employee-list-{historydate}.csv", EMPLOYEE_CSV_HEADER, _employee_csv_rows(historydate))
+
+
+@login_required
+def employee_list_csv_months(request):
+    """
+    list available Employee for each month within a date range and return as CSV (one row per contract and month)
+    """
+    today = datetime.date.today()
+    start, end = today.replace(month=1, day=1), today.replace(month=1, day=1) + relativedelta(years=1)
+    form = DateRangeForm(request.GET)
+    if form.is_valid():
+        start, end = form.cleaned_data["start"], form.cleaned_data["end"]
+
+    rows = ([month] + row for month in months_between(start, end) for row in _employee_csv_rows(month))
+    return csv_response(f"employee-list-{start}-{end}.csv", ["Month"] + EMPLOYEE_CSV_HEADER, rows)
 
 
 @login_required
@@ -190,28 +216,30 @@ def employee_bonuspayment(request):
         form = EmployeeBonusPaymentForm()
     # all employees with a contract at the end of the year
     d = datetime.date(year=year, month=12, day=31)
-    data: Dict[str, List[Decimal]] = {}
+    data: Dict[str, Dict] = {}
     e_list = Employee.objects.by_date(d)
-    # total pay for *all* employees
-    pay_total_all = Decimal("0.0")
+    # working hours for *all* employees and months of the year
+    hours_matrix = EmployeeContract.objects.hours_by_month(year, persons=e_list)
+    pay_per_month_fulltime = pay / Decimal("12.0")
     for e in e_list:
-        data[f"{e.last_name}, {e.first_name}"] = dict()
-        data[f"{e.last_name}, {e.first_name}"]["by_month"] = []
-        # pay for the current employee
-        pay_total = Decimal("0.0")
-        for hours in e.hours_by_month(year):
-            pay_per_month = Decimal("0.0")
-            if hours["hours"] > 0 and hours["hours_fulltime"] > 0:
-                pay_per_month = pay / Decimal("12.0") * hours["hours"] / hours["hours_fulltime"]
-                pay_total_all += pay_per_month
-                pay_total += pay_per_month
-            x = {
+        by_month = [
+            {
                 "hours": hours["hours"],
                 "hours_fulltime": hours["hours_fulltime"],
-                "pay": pay_per_month,
+                "pay": (
+                    pay_per_month_fulltime * hours["hours"] / hours["hours_fulltime"]
+                    if hours["hours"] > 0 and hours["hours_fulltime"] > 0
+                    else Decimal("0.0")
+                ),
             }
-            data[f"{e.last_name}, {e.first_name}"]["by_month"].append(x)
-        data[f"{e.last_name}, {e.first_name}"]["total"] = pay_total
+            for hours in hours_matrix[e.pk]
+        ]
+        data[f"{e.last_name}, {e.first_name}"] = {
+            "by_month": by_month,
+            "total": sum((x["pay"] for x in by_month), Decimal("0.0")),
+        }
+    # total pay for *all* employees
+    pay_total_all = sum((x["total"] for x in data.values()), Decimal("0.0"))
 
     return render(
         request,
@@ -256,7 +284,8 @@ def employee_check_sage_payroll(request):
         form = EmployeeCheckSagePayrollForm(request.POST, request.FILES)
         if form.is_valid():
             f = form.cleaned_data["file_pdf"]
-            payrolls = SagePayrolls(f)
+            # already parsed by the form validator
+            payrolls = parse_upload(f, "kitamanager.sage_payroll.SagePayrolls")
             data = _payrolls_data(payrolls)
             payroll_date = payrolls.date
     else:
@@ -270,6 +299,7 @@ def employee_check_sage_payroll(request):
 
 
 @login_required
+@cached_response
 def employee_charts_count_group_by_area(request):
     """
     JSON response EmployeeContracts count at a given historydate grouped by area
@@ -302,6 +332,7 @@ def employee_charts_count_group_by_area(request):
 
 
 @login_required
+@cached_response
 def employee_charts_hours_group_by_area(request):
     """
     JSON response EmployeeContract hours at a given historydate grouped by are
@@ -1,103 +1,143 @@
 import datetime
 from django.contrib.auth.decorators import login_required
+from django.shortcuts import render
+from kitamanager.cache import cached_response
 from django import forms
 from django.utils.translation import gettext_lazy as _
-from kitamanager.models import ChildContract, EmployeeContract
+from kitamanager.forms import HistoryDateForm
+from kitamanager.models import MonthlyFact
+from kitamanager.models.common import months_between
 from dateutil.relativedelta import relativedelta
 from django.http import JsonResponse
 from kitamanager.definitions import CHART_COLORS
 
+# number of months (starting with the month of the historydate) for the staffing gap forecast
+STAFFING_GAP_MONTHS = 24
+
+
+def _staffing_series(request):
+    """
+    The staffing series (see MonthlyFactManager.staffing_series()) around the requested historydate
+    The months are sampled at their first day (not at the day of the historydate)
+    """
+    historydate = forms.DateField().clean(request.GET.get("historydate", datetime.date.today()))
+    dt_from = historydate - relativedelta(years=1, day=1)
+    dt_to = historydate + relativedelta(months=6, day=1)
+    return MonthlyFact.objects.staffing_series(dt_from, dt_to)
+
 
 @login_required
+@cached_response
 def statistic_charts_child_requirement_vs_employee_hours(request):
     """
     JSON response for comparing the required hours for children with the
     available working hours from employees
     Useful for charts
     """
-    historydate = forms.DateField().clean(request.GET.get("historydate", datetime.date.today()))
-    dt_from = historydate - relativedelta(years=1)
-    dt_to = historydate + relativedelta(months=6)
-
-    labels = []
-    datasets = [
-        {
-            "label": _("requirements from children (in h/week)"),
-            "data": [],
-            "backgroundColor": CHART_COLORS[0],
-        },
-        {
-            "label": _("employee child+team working hours (in h/week)"),
-            "data": [],
-            "backgroundColor": CHART_COLORS[1],
-        },
-    ]
-
-    current = dt_from
-    while current < dt_to:
-        labels.append(current.strftime("%Y-%m"))
-        # children requirements
-        sum_requirements, sum_requirements_hours_per_week = ChildContract.objects.sum_requirements(current)
-        datasets[0]["data"].append(sum_requirements_hours_per_week)
-        # employee working hours (child + team hours + mgmt hours only)
-        sum_hours = EmployeeContract.objects.sum_hours(current)
-        sum_hours_child_team_mgmt = (
-            sum_hours["hours_child_sum"] + sum_hours["hours_team_sum"] + sum_hours["hours_management_sum"]
-        )
-        datasets[1]["data"].append(sum_hours_child_team_mgmt)
-        current = current + relativedelta(months=1)
-
+    series = _staffing_series(request)
     return JsonResponse(
         {
             "title": _("Children requirements vs. Employee working hours"),
-            "data": {"labels": labels, "datasets": datasets},
+            "data": {
+                "labels": [s.month.strftime("%Y-%m") for s in series],
+                "datasets": [
+                    {
+                        "label": _("requirements from children (in h/week)"),
+                        "data": [s.requirements_hours for s in series],
+                        "backgroundColor": CHART_COLORS[0],
+                    },
+                    {
+                        "label": _("employee child+team working hours (in h/week)"),
+                        "data": [s.employee_hours for s in series],
+                        "backgroundColor": CHART_COLORS[1],
+                    },
+                ],
+            },
         }
     )
 
 
 @login_required
+@cached_response
 def statistic_charts_child_requirement_vs_employee_hours_percent(request):
     """
     JSON response for comparing the required hours for children with the
     available working hours from employees
     This data shows the amount over or bellow 100% fullfilment
-    FIXME: This is very similar to statistic_charts_child_requirement_vs_employee_hours() !
     Useful for charts
     """
-    historydate = forms.DateField().clean(request.GET.get("historydate", datetime.date.today()))
-    dt_from = historydate - relativedelta(years=1)
-    dt_to = historydate + relativedelta(months=6)
-
-    labels = []
-    datasets = [
+    series = _staffing_series(request)
+    return JsonResponse(
         {
-            "label": _("requirements (in %)"),
-            "data": [],
-            "backgroundColor": CHART_COLORS[0],
-        },
-    ]
+            "title": _("Children requirements vs. Employee working hours in % over 100"),
+            "data": {
+                "labels": [s.month.strftime("%Y-%m") for s in series],
+                "datasets": [
+                    {
+                        "label": _("requirements (in %)"),
+                        "data": [s.percent for s in series],
+                        "backgroundColor": CHART_COLORS[0],
+                    },
+                ],
+            },
+        }
+    )
+
+
+def _staffing_gap_range(historydate: datetime.date):
+    dt_from = historydate + relativedelta(day=1)
+    return dt_from, dt_from + relativedelta(months=STAFFING_GAP_MONTHS)
+
+
+@login_required
+def statistic_staffing_gap(request):
+    """
+    Required vs. available working hours for each educational area and month
+    """
+    historydate = datetime.date.today()
+    form = HistoryDateForm(request.GET)
+    if form.is_valid():
+        historydate = form.cleaned_data["historydate"]
+    else:
+        form = HistoryDateForm(initial={"historydate": historydate.strftime("%Y-%m-%d")})
+
+    dt_from, dt_to = _staffing_gap_range(historydate)
+    series = MonthlyFact.objects.staffing_series_group_by_area(dt_from, dt_to)
+    # a row for each month with the StaffingMonth for each area
+    rows = [(month, [s[count] for s in series.values()]) for count, month in enumerate(months_between(dt_from, dt_to))]
+    context = dict(
+        historydate=historydate,
+        form=form,
+        areas=list(series.keys()),
+        rows=rows,
+    )
+    return render(request, "kitamanager/statistic_staffing_gap.html", context=context)
 
-    current = dt_from
-    while current < dt_to:
-        labels.append(current.strftime("%Y-%m"))
-        # children requirements
-        sum_requirements, sum_requirements_hours_per_week = ChildContract.objects.sum_requirements(current)
-        # employee working hours (child + team + mgmt hours only)
-        sum_hours = EmployeeContract.objects.sum_hours(current)
-        sum_hours_child_team_mgmt = (
-            sum_hours["hours_child_sum"] + sum_hours["hours_team_sum"] + sum_hours["hours_management_sum"]
-        )
-        # in percent above/below 100%
-        if sum_requirements_hours_per_week > 0:
-            x = (sum_hours_child_team_mgmt / sum_requirements_hours_per_week * 100) - 100
-        else:
-            x = 0
-        datasets[0]["data"].append(x)
-        current = current + relativedelta(months=1)
 
+@login_required
+@cached_response
+def statistic_charts_staffing_gap_by_area(request):
+    """
+    JSON response with the available minus the required working hours for
+    each educational area (negative when understaffed)
+    Useful for charts
+    """
+    historydate = forms.DateField().clean(request.GET.get("historydate", datetime.date.today()))
+    dt_from, dt_to = _staffing_gap_range(historydate)
+    series = MonthlyFact.objects.staffing_series_group_by_area(dt_from, dt_to)
     return JsonResponse(
         {
-            "title": _("Children requirements vs. Employee working hours in % over 100"),
-            "data": {"labels": labels, "datasets": datasets},
+            "title": _("Staffing gap by area (in h/week)"),
+            "data": {
+                "labels": [month.strftime("%Y-%m") for month in months_between(dt_from, dt_to)],
+                "datasets": [
+                    {
+                        "label": area,
+                        "data": [s.gap for s in area_series],
+                        "backgroundColor": CHART_COLORS[count % len(CHART_COLORS)],
+                    }
+                    for count, (area, area_series) in enumerate(series.items())
+                ],
+            },
         }
     )
@@ -53,6 +53,7 @@ if DEBUG_TOOLBAR:
     MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware',]
 
 MIDDLEWARE += [
+    'kitamanager.middleware.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -65,6 +66,22 @@ MIDDLEWARE += [
 
 CORS_ORIGIN_ALLOW_ALL = True
 
+# maximum number of queries per view (by URL name). A warning is logged when a request needs more
+# (see kitamanager.middleware.QueryStatsMiddleware)
+KITAMANAGER_QUERY_BUDGETS = {
+    'child-list': 10,
+    'employee-list': 10,
+    'employee-statistics': 5,
+    'child-statistics': 5,
+    'statistic-staffing-gap': 15,
+}
+
+# log SQL queries slower than this (in ms) together with the view name. 0 logs every query
+# (development), a negative value disables it (see kitamanager.middleware.QueryStatsMiddleware)
+KITAMANAGER_SLOW_QUERY_MS = float(os.environ.get('KITAMANAGER_SLOW_QUERY_MS', 500))
+# only log a sample (0.0 - 1.0) of the slow queries
+KITAMANAGER_SLOW_QUERY_SAMPLE_RATE = float(os.environ.get('KITAMANAGER_SLOW_QUERY_SAMPLE_RATE', 1))
+
 ROOT_URLCONF = 'kmsite.urls'
 
 TEMPLATES = [
@@ -88,6 +105,9 @@ WSGI_APPLICATION = 'kmsite.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
+# the user needs write access, even for read-only pages: the chart views compute and store missing
+# kitamanager.MonthlyFact rows. There is no database router, when adding a read replica route the
+# MonthlyFact model to the primary database
 
 DATABASES = {
     'default': {
@@ -100,6 +120,22 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# local memory by default, which is per process. When running with multiple worker processes
+# (eg. gunicorn --workers 4) a shared cache backend is REQUIRED, eg. Redis
+# (KITAMANAGER_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache and
+# KITAMANAGER_CACHE_LOCATION=redis://127.0.0.1:6379) or Memcached: the versions which invalidate the
+# compiled child payment rates and the cached responses (see kitamanager.cache) are stored in this
+# cache, so with a per process cache the other workers keep serving stale prices and charts
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('KITAMANAGER_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('KITAMANAGER_CACHE_LOCATION', 'kitamanager'),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -160,16 +196,17 @@ LOGGING = {
     },
     'loggers': {
         '': {
-            # this sets root level logger to log debug and higher level
+            # this sets root level logger to log (by default) info and higher level
             # logs to console. All other loggers inherit settings from
             # root level logger.
             'handlers': ['console'],
-            'level': 'DEBUG',
+            'level': os.environ.get('KITAMANAGER_LOG_LEVEL', 'INFO'),
             'propagate': False,
         },
-        'django.db': {
-            # django also has database level logging
-            'level': 'DEBUG'
+        'django.db.backends': {
+            # django logs every single SQL statement (only with DEBUG) at DEBUG level which is slow.
+            # Use KITAMANAGER_SLOW_QUERY_MS instead (the 'kitamanager.sql' logger)
+            'level': 'INFO',
         },
     },
 }